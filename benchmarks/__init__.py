@@ -0,0 +1,6 @@
+"""
+Benchmark suite.
+
+.. currentmodule:: benchmarks
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
@@ -0,0 +1,11 @@
+"""
+Benchmark suite entry point.
+
+.. currentmodule:: benchmarks.__main__
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from .runner import cli
+
+
+cli()
@@ -0,0 +1,69 @@
+"""
+Domain index benchmark.
+
+Times tracking prefix lookups through the domain index, against the linear
+scan of regular expressions it replaced.
+
+.. currentmodule:: benchmarks.domains
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from ghostexporter.playback.domains import DomainIndex
+from ghostexporter.playback.library import TRACKING_PREFIXES
+from timeit import repeat as timeit_repeat
+from urllib.parse import urlsplit
+import re
+
+
+URLS = (
+    "https://op3.dev/e/example.com/1.mp3",
+    "https://www.chtbl.com/track/1",
+    "https://stats.gum.fm/1.mp3",
+    "https://media.transistor.fm/a/b.mp3"
+)  #: a mix of tracking and non-tracking URLs
+
+
+def get_pattern(prefix: str):
+    """Return the regular expression once used to match a prefix."""
+    return r"^(?:www\.)?" + prefix.replace(
+        ".", "\\."
+    ).replace(
+        "*\\.",
+        "(?:[^\\.]+\\.)?"
+    ) + "$"
+
+
+def linear_match(url: str, prefixes=TRACKING_PREFIXES):
+    """Return whether a URL has a tracking prefix, checking each in turn."""
+    domain = urlsplit(url).hostname or ""
+
+    for prefix in prefixes:
+        if re.search(get_pattern(prefix), domain) is not None:
+            return True
+
+    return False
+
+
+def index_match(url: str, index: DomainIndex):
+    """Return whether a URL has a tracking prefix, using a domain index."""
+    return (urlsplit(url).hostname or "") in index
+
+
+def benchmark_domains(urls=URLS, number: int = 20000, repeat: int = 3):
+    """
+    Return the best time per lookup, in microseconds, for each approach.
+
+    Each URL is looked up `number` times, `repeat` times over, and the
+    fastest run is kept.
+    """
+    index = DomainIndex(TRACKING_PREFIXES)
+    results = {}
+
+    for name, func in (
+        ("linear", lambda: [linear_match(url) for url in urls]),
+        ("index", lambda: [index_match(url, index) for url in urls])
+    ):
+        seconds = min(timeit_repeat(func, number=number, repeat=repeat))
+        results[name] = seconds / (number * len(urls)) * 1000000
+
+    return results
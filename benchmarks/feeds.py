@@ -0,0 +1,155 @@
+"""
+Synthetic feed generator.
+
+Builds RSS feeds of any size, and stands in for the HTTP requests made while
+exporting them, so benchmarks never touch the network.
+
+.. currentmodule:: benchmarks.feeds
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import patch
+from xml.sax.saxutils import escape
+import random
+
+
+FEED_URL = "https://feeds.example.com/benchmark.xml"
+
+PROVIDERS = {
+    "transistor": "media.transistor.fm/%(podcast)08x/%(episode)08x.mp3",
+    "buzzsprout": "www.buzzsprout.com/%(podcast)d/episodes/%(episode)d.mp3",
+    "generic": "cdn.example.com/%(podcast)d/%(episode)d.mp3"
+}  #: enclosure URL patterns (without scheme) for each hosting provider
+
+TRACKING_PREFIXES = (
+    "https://op3.dev/e/",
+    "https://pdcn.co/e/",
+    "https://dts.podtrac.com/redirect.mp3/",
+    "https://chtbl.com/track/A1B2C3/"
+)  #: prefixes added to enclosure URLs, which redirect to what follows them
+
+PARAGRAPH = (
+    "<p>In this episode we talk about <strong>productivity</strong>, "
+    "<em>creativity</em> and the <a href=\"https://example.com/\">tools</a> "
+    "we use every day. <script>alert(\"stripped\")</script></p>\n"
+)
+
+
+def get_enclosure(rand, provider, podcast, episode, tracking):
+    """Return an enclosure URL, wrapped in tracking prefixes."""
+    url = PROVIDERS[provider] % {
+        "podcast": podcast,
+        "episode": episode
+    }
+
+    prefixes = [
+        prefix for prefix in TRACKING_PREFIXES
+        if rand.random() < tracking
+    ]
+
+    for prefix in prefixes:
+        url = prefix[8:] + url
+
+    return "https://" + url
+
+
+def make_feed(
+    episodes: int = 100,
+    notes_size: int = 2048,
+    tracking: float = 0.5,
+    provider: str = "transistor",
+    seed: int = 0
+):
+    """
+    Return the body of a synthetic RSS feed.
+
+    Each of the `episodes` has show notes of roughly `notes_size`
+    characters. `tracking` is the probability of each tracking prefix being
+    added to an enclosure URL.
+    """
+    rand = random.Random(seed)
+    podcast = rand.randrange(1, 0xffffff)
+    started = datetime(2015, 1, 5, 9, tzinfo=timezone.utc)
+    paragraphs = max(1, notes_size // len(PARAGRAPH))
+    notes = PARAGRAPH * paragraphs
+    chunks = [
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+        "<rss version=\"2.0\" "
+        "xmlns:itunes=\"http://www.itunes.com/dtds/podcast-1.0.dtd\" "
+        "xmlns:content=\"http://purl.org/rss/1.0/modules/content/\">\n"
+        "<channel>\n"
+        "<title>Benchmark</title>\n"
+        "<link>https://example.com/</link>\n"
+    ]
+
+    for index in range(episodes):
+        episode = seed * episodes + index + 1
+        enclosure = get_enclosure(rand, provider, podcast, episode, tracking)
+        published = started + timedelta(days=7 * index)
+
+        chunks.append(
+            "<item>\n"
+            "<title>Episode %(index)d: Synthetic episode</title>\n"
+            "<itunes:title>Synthetic episode %(index)d</itunes:title>\n"
+            "<guid isPermaLink=\"false\">benchmark-%(episode)d</guid>\n"
+            "<pubDate>%(published)s</pubDate>\n"
+            "<author>Benchmark Host</author>\n"
+            "<description>%(notes)s</description>\n"
+            "<content:encoded>%(notes)s</content:encoded>\n"
+            "<enclosure url=\"%(enclosure)s\" length=\"1000\" "
+            "type=\"audio/mpeg\" />\n"
+            "</item>\n" % {
+                "index": index + 1,
+                "episode": episode,
+                "published": format_datetime(published),
+                "notes": escape(notes),
+                "enclosure": escape(enclosure)
+            }
+        )
+
+    chunks.append("</channel>\n</rss>\n")
+    return "".join(chunks).encode("utf-8")
+
+
+class Response(object):
+    """Stand-in for a `requests` response."""
+
+    def __init__(self, status_code, headers=None, content=b""):
+        """Initialise the response."""
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+
+    def raise_for_status(self):
+        """Do nothing, as responses are always successful."""
+
+    def iter_content(self, chunk_size):
+        """Yield the body of the response in chunks."""
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        """Do nothing, as there is no connection to close."""
+
+
+def head(url, **kwargs):
+    """Redirect tracking URLs to the URL that follows the prefix."""
+    for prefix in TRACKING_PREFIXES:
+        if url.startswith(prefix):
+            return Response(302, {"Location": "https://" + url[len(prefix):]})
+
+    return Response(200)
+
+
+@contextmanager
+def serve(feed: bytes):
+    """Serve a feed, and redirect tracking URLs, instead of the network."""
+
+    def get(url, **kwargs):
+        return Response(200, {"Content-Length": str(len(feed))}, feed)
+
+    with patch("requests.get", get), patch("requests.head", head):
+        yield
@@ -0,0 +1,285 @@
+"""
+Benchmark runner.
+
+Times, and measures the peak memory of, each stage of an export of a
+synthetic feed, and compares results between runs.
+
+.. currentmodule:: benchmarks.runner
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from ghostexporter import hooks, playback
+from ghostexporter.models import ItemList, build_item
+from ghostexporter.transformers import get_transformer
+from ghostexporter.transformers.base import TransformedHook
+from ghostexporter.version import __version__
+from time import perf_counter
+from .domains import benchmark_domains
+from .feeds import FEED_URL, PROVIDERS, make_feed, serve
+import click
+import json
+import platform
+import sys
+import tracemalloc
+
+
+STAGES = (
+    "parse",
+    "sanitise",
+    "resolve",
+    "embeds",
+    "transform",
+    "write"
+)  #: stages of an export, in the order they run
+
+
+class NullStream(object):
+    """Stream that counts, then discards, what's written to it."""
+
+    def __init__(self):
+        """Initialise the stream."""
+        self.size = 0
+
+    def write(self, value):
+        """Count the length of a written value."""
+        self.size += len(value)
+
+
+def get_stages(stream: bool, serialiser: str):
+    """
+    Return a list of stage names and functions, in the order they run.
+
+    Each stage starts from the output of the one before, so no work is
+    timed twice. Post content is built in the "embeds" stage, and looked
+    up by the "transform" stage, which only builds each item's document.
+    The "write" stage serialises those documents.
+    """
+    state = {}
+
+    def parse():
+        items = ItemList(FEED_URL, stream=stream)
+        entries = items.iter_entries() if stream else items.get_feed().entries
+        state["kwargs"] = list(items.get_entries(entries))
+
+    def sanitise():
+        state["items"] = [build_item(kwargs) for kwargs in state["kwargs"]]
+
+    def resolve():
+        playback.embeds.resolve(item.enclosure for item in state["items"])
+
+    def embeds():
+        transformer = get_transformer("5")(
+            lambda: state["items"],
+            serialiser=serialiser
+        )
+
+        content = {
+            item.id: transformer.build_content(item)
+            for item in state["items"]
+        }
+
+        transformer.build_content = lambda item: content[item.id]
+        state["transformer"] = transformer
+
+    def transform():
+        state["docs"] = [
+            state["transformer"].transform_item(item)
+            for item in state["items"]
+        ]
+
+    def write():
+        state["transformer"].write_document(
+            NullStream(),
+            TransformedHook(state["docs"])
+        )
+
+    return [
+        ("parse", parse),
+        ("sanitise", sanitise),
+        ("resolve", resolve),
+        ("embeds", embeds),
+        ("transform", transform),
+        ("write", write)
+    ]
+
+
+def run_once(feed: bytes, stream: bool, serialiser: str, memory: bool):
+    """Run each stage against a feed, returning timings or peak memory."""
+    results = {}
+
+    with serve(feed):
+        for name, func in get_stages(stream, serialiser):
+            if memory:
+                tracemalloc.start()
+                func()
+                results[name] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                started = perf_counter()
+                func()
+                results[name] = perf_counter() - started
+
+    return results
+
+
+def benchmark(
+    episodes: int = 100,
+    notes_size: int = 2048,
+    tracking: float = 0.5,
+    provider: str = "transistor",
+    repeat: int = 3,
+    stream: bool = False,
+    serialiser: str = "auto"
+):
+    """
+    Return benchmark results for an export of a synthetic feed.
+
+    Each stage is timed `repeat` times, with a differently-seeded feed each
+    time so that tracking redirects aren't answered from memory, and the
+    best time is kept. Peak memory is measured in a separate run, as
+    tracing allocations slows everything down.
+    """
+    hooks.emit("ready")
+    params = {
+        "episodes": episodes,
+        "notes_size": notes_size,
+        "tracking": tracking,
+        "provider": provider,
+        "repeat": repeat,
+        "stream": stream,
+        "serialiser": serialiser
+    }
+
+    feeds = [
+        make_feed(episodes, notes_size, tracking, provider, seed)
+        for seed in range(repeat + 1)
+    ]
+
+    runs = [
+        run_once(feed, stream, serialiser, False)
+        for feed in feeds[:-1]
+    ]
+
+    peaks = run_once(feeds[-1], stream, serialiser, True)
+
+    stages = {}
+    for name in STAGES:
+        seconds = min(run[name] for run in runs)
+        stages[name] = {
+            "seconds": seconds,
+            "per_item_us": seconds / max(episodes, 1) * 1000000,
+            "peak_bytes": peaks[name]
+        }
+
+    return {
+        "ghostexporter": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "stages": stages
+    }
+
+
+@click.group()
+def cli():
+    """Benchmark the stages of a Ghost export."""
+
+
+@cli.command()
+@click.option("--episodes", "-n", default=100, type=click.IntRange(min=1), help="Number of episodes in the feed.")  # noqa
+@click.option("--notes-size", default=2048, type=click.IntRange(min=0), help="Approximate size of each episode's show notes.")  # noqa
+@click.option("--tracking", default=0.5, type=click.FloatRange(0, 1), help="Probability of each tracking prefix being used.")  # noqa
+@click.option("--provider", default="transistor", type=click.Choice(sorted(PROVIDERS)), help="Hosting provider of the enclosures.")  # noqa
+@click.option("--repeat", default=3, type=click.IntRange(min=1), help="Number of timed runs.")  # noqa
+@click.option("--stream", is_flag=True, help="Parse the feed incrementally.")
+@click.option("--json-backend", default="auto", type=click.Choice(["auto", "json", "orjson"]), help="JSON serialisation backend.")  # noqa
+@click.option("--output", "-o", type=click.File("w"), default="-", help="File to save results to.")  # noqa
+def run(
+    episodes: int,
+    notes_size: int,
+    tracking: float,
+    provider: str,
+    repeat: int,
+    stream: bool,
+    json_backend: str,
+    output
+):
+    """Benchmark an export of a synthetic feed, saving results as JSON."""
+    results = benchmark(
+        episodes=episodes,
+        notes_size=notes_size,
+        tracking=tracking,
+        provider=provider,
+        repeat=repeat,
+        stream=stream,
+        serialiser=json_backend
+    )
+
+    json.dump(results, output, indent=4)
+    output.write("\n")
+
+    for name, stage in results["stages"].items():
+        click.echo(
+            "%-10s %10.2f us/item %12d bytes peak" % (
+                name,
+                stage["per_item_us"],
+                stage["peak_bytes"]
+            ),
+            err=True
+        )
+
+
+@cli.command()
+@click.argument("before", type=click.File("r"))
+@click.argument("after", type=click.File("r"))
+@click.option("--threshold", default=1.1, help="Slowdown ratio treated as a regression.")  # noqa
+def compare(before, after, threshold: float):
+    """Compare two sets of results, failing if any stage regressed."""
+    before = json.load(before)
+    after = json.load(after)
+    regressed = False
+
+    if before["params"] != after["params"]:
+        click.echo("Warning: results were run with different parameters.", err=True)  # noqa
+
+    for name in STAGES:
+        if name not in before["stages"] or name not in after["stages"]:
+            continue
+
+        old = before["stages"][name]
+        new = after["stages"][name]
+        ratio = new["per_item_us"] / max(old["per_item_us"], 1e-9)
+        flag = ""
+
+        if ratio > threshold:
+            regressed = True
+            flag = "  REGRESSION"
+
+        click.echo(
+            "%-10s %10.2f -> %10.2f us/item (x%.2f)  "
+            "%12d -> %12d bytes peak%s" % (
+                name,
+                old["per_item_us"],
+                new["per_item_us"],
+                ratio,
+                old["peak_bytes"],
+                new["peak_bytes"],
+                flag
+            )
+        )
+
+    if regressed:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option("--number", "-n", default=20000, type=click.IntRange(min=1), help="Number of lookups of each URL per run.")  # noqa
+@click.option("--repeat", default=3, type=click.IntRange(min=1), help="Number of timed runs.")  # noqa
+def domains(number: int, repeat: int):
+    """Compare tracking prefix lookups against a linear scan."""
+    results = benchmark_domains(number=number, repeat=repeat)
+
+    for name, per_url_us in results.items():
+        click.echo("%-10s %10.2f us/url" % (name, per_url_us))
+
+    click.echo("speedup    x%.1f" % (results["linear"] / results["index"]))
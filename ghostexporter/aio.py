@@ -0,0 +1,112 @@
+"""
+Asyncio export engine.
+
+An alternative to exporting with :meth:`ItemList.to`, in which feeds are
+fetched and tracking redirects followed concurrently, so one slow host
+doesn't hold up every other request. The document is identical to the one
+the synchronous engine produces::
+
+    import asyncio
+    import sys
+    from ghostexporter.aio import export
+    from ghostexporter.models import ItemList
+
+    asyncio.run(export(ItemList(url), sys.stdout))
+
+.. currentmodule:: ghostexporter.aio
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from . import hooks, settings
+from .playback import embeds
+import asyncio
+
+
+class HostPool(object):
+    """
+    Runs blocking work in threads on behalf of an event loop.
+
+    Requests are limited to `connections` at a time per host, across at
+    most `workers` threads.
+    """
+
+    def __init__(
+        self,
+        connections: int = settings.HOST_CONNECTIONS,
+        workers: int = settings.ASYNC_WORKERS
+    ):
+        """Initialise the pool."""
+        self.__connections = connections
+        self.__semaphores = {}
+        self.__executor = ThreadPoolExecutor(max_workers=workers)
+
+    def get_semaphore(self, url: str):
+        """Return the semaphore that limits requests to a URL's host."""
+        host = urlsplit(url).netloc
+        semaphore = self.__semaphores.get(host)
+
+        if semaphore is None:
+            semaphore = self.__semaphores[host] = asyncio.Semaphore(
+                self.__connections
+            )
+
+        return semaphore
+
+    async def run(self, func: callable, *args):
+        """Run a blocking function in a thread, returning its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__executor, func, *args)
+
+    async def request(self, url: str, func: callable, *args):
+        """Run a blocking function that makes a request to a URL's host."""
+        async with self.get_semaphore(url):
+            return await self.run(func, *args)
+
+    def close(self):
+        """Shut down the pool's threads."""
+        self.__executor.shutdown()
+
+
+async def prepare(items, pool: HostPool = None):
+    """
+    Fetch the items in a list, and resolve their enclosures' redirects.
+
+    `items` is an :class:`ItemList` or :class:`MergedItemList`. Raises
+    :class:`FeedNotModified` if no feeds have changed since they were last
+    exported.
+    """
+    owned = pool is None
+    pool = pool or HostPool()
+
+    try:
+        feed_items = await items.all_async(pool)
+        await embeds.resolve_async(
+            (item.enclosure for item in feed_items),
+            pool
+        )
+
+        await hooks.drain()
+    finally:
+        if owned:
+            pool.close()
+
+
+async def export(
+    items,
+    stream,
+    version: str = "5",
+    serialiser: str = None,
+    pool: HostPool = None
+):
+    """
+    Write a Ghost document for an item list to a stream.
+
+    Returns once async listeners for events emitted along the way have
+    finished.
+    """
+    await prepare(items, pool)
+    items.to(version, serialiser=serialiser).write(stream)
+    items.save_state()
+    await hooks.drain()
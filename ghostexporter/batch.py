@@ -0,0 +1,267 @@
+"""
+Batch export module.
+
+Spreads a large catalogue of feeds over a pool of worker processes, so that
+parsing, sanitisation and serialisation aren't limited to one core. Idle
+workers take the next feed from a shared queue, so a few very long feeds
+don't hold up the rest of the catalogue.
+
+Each worker fetches, builds and transforms whole feeds, keeping its plugin
+registry and caches warm between them. Posts come back to the parent
+already serialised, where a single writer produces one combined document,
+or one document per feed::
+
+    import sys
+    from ghostexporter.batch import BatchRunner
+
+    BatchRunner(urls, processes=8).write(sys.stdout)
+
+.. currentmodule:: ghostexporter.batch
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from . import settings
+from .transformers import get_transformer
+from .transformers.base import TransformedHook
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+__worker = {}  # state kept by each worker process between feeds
+
+
+def start_worker(options: dict):
+    """
+    Prepare a worker process to export feeds.
+
+    Plugins are discovered, and caches and an HTTP session opened, once per
+    process. See :class:`BatchRunner` for the options.
+    """
+    from . import hooks, playback
+    from .cache import Cache, MemoryCache
+    from requests.adapters import HTTPAdapter
+    import requests
+
+    cache_dir = options.get("cache_dir")
+    feed_cache = None
+    episode_cache = None
+
+    if cache_dir:
+        playback.embeds.manifest = os.path.join(cache_dir, "plugins.json")
+
+    hooks.emit("ready")
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=settings.REDIRECT_WORKERS,
+        pool_maxsize=settings.REDIRECT_WORKERS
+    )
+
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    playback.embeds.session = session
+
+    if cache_dir:
+        # Caches are shared by every worker, so reads don't take the
+        # write lock unless a key hasn't been used for a while.
+        playback.embeds.cache = Cache(
+            os.path.join(cache_dir, "redirects.sqlite3"),
+            name="redirects",
+            max_entries=settings.REDIRECT_CACHE_MAX_ENTRIES,
+            touch_interval=settings.CACHE_TOUCH_INTERVAL
+        )
+
+        if options.get("skip_unchanged"):
+            feed_cache = Cache(
+                os.path.join(cache_dir, "feeds.sqlite3"),
+                name="feeds",
+                max_entries=settings.FEED_CACHE_MAX_ENTRIES,
+                touch_interval=settings.CACHE_TOUCH_INTERVAL
+            )
+
+        if options.get("since_state"):
+            episode_cache = Cache(
+                os.path.join(cache_dir, "episodes.sqlite3"),
+                name="episodes",
+                touch_interval=settings.CACHE_TOUCH_INTERVAL
+            )
+    else:
+        playback.embeds.cache = MemoryCache(
+            max_entries=settings.REDIRECT_CACHE_MAX_ENTRIES
+        )
+
+    if options.get("tracking_prefixes"):
+        from .playback.domains import load_patterns
+
+        playback.embeds.add_tracking_prefixes(
+            load_patterns(options["tracking_prefixes"])
+        )
+
+    __worker.update(
+        options,
+        session=session,
+        feed_cache=feed_cache,
+        episode_cache=episode_cache
+    )
+
+
+def export_feed(url: str):
+    """
+    Fetch and transform a feed in a worker process.
+
+    Returns a list of serialised documents, one for each item, or `None`
+    if the feed hasn't changed since it was last exported.
+    """
+    from .models import FeedNotModified, ItemList
+    from .playback import embeds
+
+    embeds.reset_hops()
+    items = ItemList(
+        url,
+        cache=__worker["feed_cache"],
+        force=__worker.get("force", False),
+        episodes=__worker["episode_cache"],
+        stream=__worker.get("stream", False),
+        max_size=__worker.get("max_size", settings.MAX_FEED_SIZE),
+        session=__worker["session"]
+    )
+
+    try:
+        items.all()
+    except FeedNotModified:
+        return None
+
+    transformer = items.to(
+        __worker.get("version", "5"),
+        serialiser=__worker.get("serialiser")
+    )
+
+    docs = [
+        transformer.serialise_item(doc)
+        for doc in transformer.items_hook.transform()
+    ]
+
+    # State is recorded by the worker that owns the feed's caches, once
+    # every item has been transformed.
+    items.save_state()
+    return docs
+
+
+class BatchRunner(object):
+    """
+    Exports a catalogue of feeds across a pool of worker processes.
+
+    `processes` defaults to the number of CPUs. Workers are started with
+    the `multiprocessing` method named by `start_method` (or
+    `settings.BATCH_START_METHOD`), which defaults to the platform's own.
+
+    Other keyword arguments are options for each worker: `cache_dir`,
+    `since_state`, `skip_unchanged`, `force`, `stream`, `max_size` and
+    `tracking_prefixes`, which behave as the command-line options of the
+    same names.
+
+    Once the runner has been used, `exported`, `unchanged` and `failed` hold
+    the number of feeds in each state.
+    """
+
+    def __init__(
+        self,
+        urls,
+        version: str = "5",
+        serialiser: str = None,
+        processes: int = None,
+        start_method: str = None,
+        **options
+    ):
+        """Initialise the runner with a list of feed URLs."""
+        self.exported = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.__urls = list(dict.fromkeys(urls))
+        self.__version = version
+        self.__serialiser = serialiser
+        self.__processes = processes
+        self.__start_method = start_method
+        self.__options = dict(
+            options,
+            version=version,
+            serialiser=serialiser
+        )
+
+    def get_transformer(self):
+        """Return a transformer used to write documents."""
+        return get_transformer(self.__version)(
+            list,
+            serialiser=self.__serialiser
+        )
+
+    def run(self):
+        """
+        Export every feed, yielding results as each one finishes.
+
+        Yields the index of each feed in the catalogue, its URL, and a list
+        of its serialised item documents. Feeds that haven't changed, or
+        fail to export, aren't yielded.
+        """
+        with ProcessPoolExecutor(
+            max_workers=self.__processes,
+            mp_context=get_context(
+                self.__start_method or settings.BATCH_START_METHOD
+            ),
+            initializer=start_worker,
+            initargs=(self.__options,)
+        ) as executor:
+            futures = {
+                executor.submit(export_feed, url): (index, url)
+                for index, url in enumerate(self.__urls)
+            }
+
+            for future in as_completed(futures):
+                index, url = futures.pop(future)
+
+                try:
+                    docs = future.result()
+                except Exception:
+                    logger.exception("Failed to export %s", url)
+                    self.failed += 1
+                    continue
+
+                if docs is None:
+                    self.unchanged += 1
+                    continue
+
+                self.exported += 1
+                yield index, url, docs
+
+    def iter_docs(self):
+        """Yield every feed's item documents, as each feed finishes."""
+        for index, url, docs in self.run():
+            yield from docs
+
+    def write(self, stream):
+        """
+        Write one document containing every feed's posts to a stream.
+
+        Posts are written in the order their feeds finish, rather than by
+        publish date, so that no feed has to be held back in memory.
+        """
+        self.get_transformer().write_document(
+            stream,
+            TransformedHook(self.iter_docs())
+        )
+
+    def write_feeds(self, open_feed: callable):
+        """
+        Write a separate document for each feed.
+
+        `open_feed` is called with the index and URL of each feed, and must
+        return a writable stream, used as a context manager.
+        """
+        transformer = self.get_transformer()
+
+        for index, url, docs in self.run():
+            with open_feed(index, url) as stream:
+                transformer.write_document(stream, TransformedHook(docs))
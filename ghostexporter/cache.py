@@ -0,0 +1,235 @@
+"""
+Persistent cache module.
+
+.. currentmodule:: ghostexporter.cache
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from . import settings
+import json
+import os
+import sqlite3
+import time
+
+
+MISSING = object()  #: returned by :meth:`Cache.get` when a key isn't cached
+
+
+class Cache(object):
+    """
+    SQLite-backed key/value cache.
+
+    Values are stored as JSON with an expiry time. Once the cache holds more
+    than `max_entries` keys, the least recently used ones are evicted, along
+    with a further `settings.CACHE_EVICTION_BATCH` of `max_entries`, so
+    eviction only runs every so often.
+
+    The database is opened in WAL mode, so it can be shared by several
+    processes. When `touch_interval` is set, reading a key only records
+    that it was used if it hasn't been for that many seconds, so readers
+    rarely need to wait for the write lock.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str = "cache",
+        max_entries: int = 0,
+        touch_interval: float = 0
+    ):
+        """Open (or create) a cache table within a SQLite database."""
+        dirname = os.path.dirname(path)
+
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.__name = name
+        self.__max_entries = max_entries
+        self.__touch_interval = touch_interval
+        self.__lock = Lock()
+        self.__db = sqlite3.connect(
+            path,
+            timeout=settings.CACHE_TIMEOUT,
+            check_same_thread=False
+        )
+
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute(
+            "CREATE TABLE IF NOT EXISTS %s ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT, "
+            "expires REAL, "
+            "accessed REAL"
+            ")" % name
+        )
+
+        self.__db.execute(
+            "CREATE INDEX IF NOT EXISTS %s_accessed "
+            "ON %s (accessed)" % (name, name)
+        )
+
+        self.__db.commit()
+        self.__count = len(self)
+
+    def get(self, key: str, default=None):
+        """Return the cached value for a key, or `default`."""
+        now = time.time()
+
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT value, expires, accessed FROM %s "
+                "WHERE key = ?" % self.__name,
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                return default
+
+            value, expires, accessed = row
+            if expires is not None and expires <= now:
+                self.__count -= self.__db.execute(
+                    "DELETE FROM %s WHERE key = ?" % self.__name,
+                    (key,)
+                ).rowcount
+
+                self.__db.commit()
+                return default
+
+            if now - accessed > self.__touch_interval:
+                self.__db.execute(
+                    "UPDATE %s SET accessed = ? WHERE key = ?" % self.__name,
+                    (now, key)
+                )
+
+                self.__db.commit()
+
+        return json.loads(value)
+
+    def set(self, key: str, value, ttl: float = None):
+        """Cache a value, optionally expiring after `ttl` seconds."""
+        now = time.time()
+        expires = now + ttl if ttl else None
+
+        value = json.dumps(value)
+
+        with self.__lock:
+            cursor = self.__db.execute(
+                "INSERT OR IGNORE INTO %s (key, value, expires, accessed) "
+                "VALUES (?, ?, ?, ?)" % self.__name,
+                (key, value, expires, now)
+            )
+
+            if cursor.rowcount:
+                self.__count += 1
+            else:
+                self.__db.execute(
+                    "UPDATE %s SET value = ?, expires = ?, accessed = ? "
+                    "WHERE key = ?" % self.__name,
+                    (value, expires, now, key)
+                )
+
+            if self.__max_entries and self.__count > self.__max_entries:
+                self.evict()
+
+            self.__db.commit()
+
+    def evict(self):
+        """
+        Evict the least recently used keys, if there are too many.
+
+        The number of keys is only counted here, as other processes may
+        share the table. Called with the lock held.
+        """
+        self.__count = self.__db.execute(
+            "SELECT COUNT(*) FROM %s" % self.__name
+        ).fetchone()[0]
+
+        excess = self.__count - self.__max_entries
+        if excess <= 0:
+            return
+
+        excess += int(self.__max_entries * settings.CACHE_EVICTION_BATCH)
+        self.__count -= self.__db.execute(
+            "DELETE FROM %s WHERE key IN ("
+            "SELECT key FROM %s ORDER BY accessed LIMIT ?"
+            ")" % (self.__name, self.__name),
+            (excess,)
+        ).rowcount
+
+    def delete(self, key: str):
+        """Remove a key from the cache."""
+        with self.__lock:
+            self.__count -= self.__db.execute(
+                "DELETE FROM %s WHERE key = ?" % self.__name,
+                (key,)
+            ).rowcount
+
+            self.__db.commit()
+
+    def __len__(self):
+        """Return the number of cached keys."""
+        with self.__lock:
+            return self.__db.execute(
+                "SELECT COUNT(*) FROM %s" % self.__name
+            ).fetchone()[0]
+
+    def close(self):
+        """Close the underlying database."""
+        with self.__lock:
+            self.__db.close()
+
+
+class MemoryCache(object):
+    """
+    In-memory key/value cache, with the same interface as :class:`Cache`.
+
+    Used by long-running processes that don't need state to outlive them.
+    """
+
+    def __init__(self, max_entries: int = 0):
+        """Initialise the cache."""
+        self.__max_entries = max_entries
+        self.__lock = Lock()
+        self.__values = OrderedDict()
+
+    def get(self, key: str, default=None):
+        """Return the cached value for a key, or `default`."""
+        with self.__lock:
+            if key not in self.__values:
+                return default
+
+            value, expires = self.__values[key]
+            if expires is not None and expires <= time.time():
+                del self.__values[key]
+                return default
+
+            self.__values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float = None):
+        """Cache a value, optionally expiring after `ttl` seconds."""
+        expires = time.time() + ttl if ttl else None
+
+        with self.__lock:
+            self.__values[key] = (value, expires)
+            self.__values.move_to_end(key)
+
+            while self.__max_entries and (
+                len(self.__values) > self.__max_entries
+            ):
+                self.__values.popitem(last=False)
+
+    def delete(self, key: str):
+        """Remove a key from the cache."""
+        with self.__lock:
+            self.__values.pop(key, None)
+
+    def __len__(self):
+        """Return the number of cached keys."""
+        with self.__lock:
+            return len(self.__values)
+
+    def close(self):
+        """Do nothing, as there is nothing to close."""
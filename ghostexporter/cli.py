@@ -16,10 +16,10 @@ It can be used as a handy facility for running the task from a command line.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from . import hooks, playback
-from .models import Feed
+from . import settings
 import click
 import logging
+import os
 import sys
 
 
@@ -33,14 +33,289 @@ LOGGING_LEVELS = {
 
 
 DEFAULT_VERSION = "5"
+SHARD_FILENAME = "ghost-%04d.json"  #: name of each document in --output-dir
+FEED_FILENAME = "ghost-feed-%05d.json"  #: name of each --processes document
+WATCH_FILENAME = "ghost-%Y%m%dT%H%M%SZ.json"  #: name of each --watch document
+
+
+def get_urls(args):
+    """Return feed URLs from arguments, expanding @FILE arguments."""
+    for arg in args:
+        if not arg.startswith("@"):
+            yield arg
+            continue
+
+        with open(arg[1:], "r") as f:
+            for line in f:
+                line = line.strip()
+
+                if line and not line.startswith("#"):
+                    yield line
+
+
+def open_shard(
+    output_dir: str,
+    index: int,
+    compression: str = None,
+    level: int = None
+):
+    """Open the file for a numbered document in an output directory."""
+    from .compression import EXTENSIONS, open_output
+
+    filename = SHARD_FILENAME % (index + 1)
+    if compression:
+        filename += EXTENSIONS[compression]
+
+    return open_output(
+        os.path.join(output_dir, filename),
+        compression or "none",
+        level
+    )
+
+
+def export(
+    items,
+    version: str,
+    serialiser: str,
+    engine: str = "sync",
+    uploader=None,
+    output_dir: str = None,
+    shard_size: int = None,
+    shard_bytes: int = None,
+    output: str = None,
+    compression: str = "auto",
+    compress_level: int = None
+):
+    """
+    Write a Ghost document for a list of items to stdout, or a file.
+
+    When an uploader is given, posts are uploaded to the Ghost Admin API
+    instead. When an output directory is given, posts are split across
+    numbered documents in that directory.
+    """
+    from . import hooks
+    from .compression import get_compression, open_output
+    from .models import FeedNotModified
+
+    try:
+        if engine == "asyncio":
+            import asyncio
+            from . import aio
+
+            asyncio.run(aio.prepare(items))
+        else:
+            items.check()
+    except FeedNotModified:
+        click.echo("Feed has not changed since it was last exported.", err=True)  # noqa
+        return
+
+    doc = items.to(version, serialiser=serialiser)
+
+    if uploader is not None:
+        from .upload import UploadError
+
+        try:
+            uploader.upload(doc)
+        except UploadError as ex:
+            raise click.ClickException(str(ex))
+        finally:
+            click.echo(
+                "Created %d posts, updated %d." % (
+                    uploader.created,
+                    uploader.updated
+                ),
+                err=True
+            )
+    elif output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        compression = get_compression(None, compression)
+        count = doc.write_shards(
+            lambda index: open_shard(
+                output_dir,
+                index,
+                compression,
+                compress_level
+            ),
+            max_items=shard_size,
+            max_size=shard_bytes
+        )
+
+        click.echo("Wrote %d documents to %s." % (count, output_dir), err=True)  # noqa
+    else:
+        with open_output(output, compression, compress_level) as stream:
+            doc.write(stream)
+
+    items.save_state()
+    hooks.join()
+
+
+def write_new_items(
+    items,
+    version: str,
+    serialiser: str,
+    uploader=None,
+    output_dir: str = None,
+    compression: str = "auto",
+    compress_level: int = None
+):
+    """
+    Write a Ghost document for newly published items found by --watch.
+
+    Documents are written to stdout, each followed by a newline, or to a
+    timestamped file in an output directory. When an uploader is given,
+    posts are uploaded to the Ghost Admin API instead.
+    """
+    from .compression import EXTENSIONS, get_compression, open_output
+    from datetime import datetime, timezone
+
+    doc = items.to(version, serialiser=serialiser)
+
+    if uploader is not None:
+        uploader.upload(doc)
+        click.echo(
+            "Created %d posts, updated %d." % (
+                uploader.created,
+                uploader.updated
+            ),
+            err=True
+        )
+
+        return
+
+    if not output_dir:
+        with open_output(None, compression, compress_level) as stream:
+            doc.write(stream)
+            stream.write("\n")
+            stream.flush()
+
+        return
+
+    compression = get_compression(None, compression)
+    filename = datetime.now(timezone.utc).strftime(WATCH_FILENAME)
+    if compression:
+        filename += EXTENSIONS[compression]
+
+    path = os.path.join(output_dir, filename)
+    with open_output(path, compression or "none", compress_level) as stream:
+        doc.write(stream)
+
+    click.echo("Wrote %d posts to %s." % (len(items.all()), path), err=True)
+
+
+def export_batch(
+    runner,
+    output: str = None,
+    output_dir: str = None,
+    compression: str = "auto",
+    compress_level: int = None
+):
+    """
+    Export a catalogue of feeds with a :class:`BatchRunner`.
+
+    One combined document is written to stdout or a file. When an output
+    directory is given, a document is written there for each feed instead,
+    numbered by the feed's position in the catalogue.
+    """
+    from .compression import EXTENSIONS, get_compression, open_output
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        compression = get_compression(None, compression)
+
+        def open_feed(index: int, url: str):
+            filename = FEED_FILENAME % (index + 1)
+            if compression:
+                filename += EXTENSIONS[compression]
+
+            return open_output(
+                os.path.join(output_dir, filename),
+                compression or "none",
+                compress_level
+            )
+
+        runner.write_feeds(open_feed)
+    else:
+        with open_output(output, compression, compress_level) as stream:
+            runner.write(stream)
+
+    click.echo(
+        "Exported %d feeds (%d unchanged, %d failed)." % (
+            runner.exported,
+            runner.unchanged,
+            runner.failed
+        ),
+        err=True
+    )
+
+    if runner.failed:
+        raise click.ClickException("%d feeds failed to export." % runner.failed)  # noqa
 
 
 @click.command()
 @click.argument("url")
+@click.argument("urls", nargs=-1)
 @click.option("--version", default=DEFAULT_VERSION, help="Document version number.")  # noqa
+@click.option("--json-backend", default="auto", type=click.Choice(["auto", "json", "orjson"]), help="JSON serialisation backend.")  # noqa
+@click.option("--engine", default="sync", type=click.Choice(["sync", "asyncio"]), help="Run requests one after another, or concurrently with asyncio.")  # noqa
+@click.option("--jobs", "-j", default=1, type=click.IntRange(min=1), help="Number of processes used to build items.")  # noqa
+@click.option("--processes", "-P", type=click.IntRange(min=1), help="Spread feeds over this many worker processes.")  # noqa
+@click.option("--stream", is_flag=True, help="Parse feeds incrementally, one entry at a time.")  # noqa
+@click.option("--max-feed-size", type=click.IntRange(min=1), help="Abandon feeds larger than this many bytes.")  # noqa
+@click.option("--cache-dir", type=click.Path(file_okay=False), help="Directory used for persistent caches.")  # noqa
+@click.option("--since-state", is_flag=True, help="Only export episodes that are new or changed since the last export. Requires --cache-dir.")  # noqa
+@click.option("--skip-unchanged", is_flag=True, help="Skip feeds that haven't changed since they were last exported. Requires --cache-dir.")  # noqa
+@click.option("--force", is_flag=True, help="Export the feed even if it hasn't changed, with --skip-unchanged or --since-state.")  # noqa
+@click.option("--watch", is_flag=True, help="Keep running, polling feeds and writing a document of new episodes whenever they change.")  # noqa
+@click.option("--tracking-prefixes", type=click.Path(exists=True, dir_okay=False), help="File listing extra tracking prefix domains, one per line.")  # noqa
+@click.option("--ghost-url", help="Upload posts to this Ghost site's Admin API, instead of writing a document.")  # noqa
+@click.option("--ghost-admin-key", envvar="GHOST_ADMIN_API_KEY", help="Ghost Admin API key, in the form id:secret.")  # noqa
+@click.option("--batch-size", default=settings.UPLOAD_BATCH_SIZE, type=click.IntRange(min=1), help="Number of posts uploaded per batch.")  # noqa
+@click.option("--upload-workers", default=settings.UPLOAD_WORKERS, type=click.IntRange(min=1), help="Number of posts uploaded at a time.")  # noqa
+@click.option("--output", "-o", type=click.Path(dir_okay=False, allow_dash=True), help="File to write the document to, instead of stdout.")  # noqa
+@click.option("--compress", type=click.Choice(["auto", "none", "gzip", "zstd"]), default="auto", help="Compression format. By default, chosen by the output filename.")  # noqa
+@click.option("--compress-level", type=int, help="Compression level: 1-9 for gzip, 1-22 for zstd. Requires compression.")  # noqa
+@click.option("--output-dir", type=click.Path(file_okay=False), help="Split posts across numbered documents in this directory.")  # noqa
+@click.option("--shard-size", type=click.IntRange(min=1), help="Maximum number of posts in each document. Requires --output-dir.")  # noqa
+@click.option("--shard-bytes", type=click.IntRange(min=1), help="Maximum size of each document in bytes. Requires --output-dir.")  # noqa
+@click.option("--profile", is_flag=True, help="Print a breakdown of time spent in each stage to stderr.")  # noqa
+@click.option("--profile-output", type=click.Path(dir_okay=False), help="File to save cProfile stats to.")  # noqa
 @click.option("--verbose", "-v", count=True, help="Enable verbose output.")
-def cli(url: str, version: str = DEFAULT_VERSION, verbose: int = 0):
-    """Convert a podcast RSS feed into a Ghost JSON document."""
+def cli(
+    url: str,
+    urls: tuple = (),
+    version: str = DEFAULT_VERSION,
+    json_backend: str = "auto",
+    engine: str = "sync",
+    jobs: int = 1,
+    processes: int = None,
+    stream: bool = False,
+    max_feed_size: int = None,
+    cache_dir: str = None,
+    since_state: bool = False,
+    skip_unchanged: bool = False,
+    force: bool = False,
+    watch: bool = False,
+    tracking_prefixes: str = None,
+    ghost_url: str = None,
+    ghost_admin_key: str = None,
+    batch_size: int = settings.UPLOAD_BATCH_SIZE,
+    upload_workers: int = settings.UPLOAD_WORKERS,
+    output: str = None,
+    compress: str = "auto",
+    compress_level: int = None,
+    output_dir: str = None,
+    shard_size: int = None,
+    shard_bytes: int = None,
+    profile: bool = False,
+    profile_output: str = None,
+    verbose: int = 0
+):
+    """
+    Convert podcast RSS feeds into a Ghost JSON document.
+
+    Pass one or more feed URLs, or @FILE to read URLs from a file, one per
+    line. Posts from multiple feeds are combined into one document.
+    """
     # Use the verbosity count to determine the logging level
     if verbose > 0:
         logging.basicConfig(
@@ -57,7 +332,251 @@ def cli(url: str, version: str = DEFAULT_VERSION, verbose: int = 0):
             )
         )
 
+    if stream and jobs > 1:
+        raise click.UsageError("--stream builds items one at a time, so can't be used with --jobs.")  # noqa
+
+    if since_state and not cache_dir:
+        raise click.UsageError("--since-state requires --cache-dir.")
+
+    if skip_unchanged and not cache_dir:
+        raise click.UsageError("--skip-unchanged requires --cache-dir.")
+
+    if ghost_url and not ghost_admin_key:
+        raise click.UsageError("--ghost-url requires --ghost-admin-key.")
+
+    if ghost_url and (output or output_dir or compress != "auto" or compress_level is not None):  # noqa
+        raise click.UsageError("--ghost-url can't be used with --output, --output-dir, --compress or --compress-level.")  # noqa
+
+    if (shard_size or shard_bytes) and not output_dir:
+        raise click.UsageError("--shard-size and --shard-bytes require --output-dir.")  # noqa
+
+    if watch and (shard_size or shard_bytes):
+        raise click.UsageError("--shard-size and --shard-bytes can't be used with --watch.")  # noqa
+
+    if watch and output:
+        raise click.UsageError("--output can't be used with --watch. Use --output-dir instead.")  # noqa
+
+    if watch and engine != "sync":
+        raise click.UsageError("--watch only supports the sync engine.")
+
+    if processes and (watch or ghost_url or shard_size or shard_bytes):
+        raise click.UsageError("--processes can't be used with --watch, --ghost-url, --shard-size or --shard-bytes.")  # noqa
+
+    if processes and (profile or profile_output or jobs > 1):
+        raise click.UsageError("--processes can't be used with --profile, --profile-output or --jobs.")  # noqa
+
+    if processes and engine != "sync":
+        raise click.UsageError("--processes only supports the sync engine.")
+
+    if output_dir and not (watch or processes or shard_size or shard_bytes):
+        raise click.UsageError("--output-dir requires --shard-size, --shard-bytes, --processes or --watch.")  # noqa
+
+    if output and output_dir:
+        raise click.UsageError("--output and --output-dir can't be used together.")  # noqa
+
+    from .compression import LEVEL_RANGES, get_compression, is_available
+    from importlib.util import find_spec
+
+    if json_backend == "orjson" and find_spec("orjson") is None:
+        raise click.UsageError("--json-backend orjson requires the orjson package.")  # noqa
+
+    compression = get_compression(output, compress)
+    if not is_available(compression):
+        raise click.UsageError("zstd compression requires the zstandard package.")  # noqa
+
+    if compress_level is not None and not compression:
+        raise click.UsageError("--compress-level requires gzip or zstd compression, chosen with --compress or the output filename.")  # noqa
+
+    if compression and compress_level is not None:
+        low, high = LEVEL_RANGES[compression]
+
+        if not low <= compress_level <= high:
+            raise click.UsageError(f"--compress-level must be between {low} and {high} for {compression} compression.")  # noqa
+
+    if processes:
+        from .batch import BatchRunner
+
+        # Plugins and caches are set up by each worker process.
+        export_batch(
+            BatchRunner(
+                get_urls((url,) + tuple(urls)),
+                version,
+                json_backend,
+                processes,
+                cache_dir=cache_dir,
+                since_state=since_state,
+                skip_unchanged=skip_unchanged or since_state,
+                force=force,
+                stream=stream,
+                max_size=max_feed_size or settings.MAX_FEED_SIZE,
+                tracking_prefixes=tracking_prefixes
+            ),
+            output,
+            output_dir,
+            compress,
+            compress_level
+        )
+
+        return
+
+    # Everything an export needs is imported here rather than at module
+    # level, so --help and usage errors only pay for importing click.
+    from . import hooks, playback
+    from .cache import Cache, MemoryCache
+    from .models import Feed, FeedTooLarge, MergedItemList
+    from xml.etree.ElementTree import ParseError
+    from .playback.domains import load_patterns
+
+    if cache_dir:
+        playback.embeds.manifest = os.path.join(cache_dir, "plugins.json")
+
     hooks.emit("ready")
-    feed = Feed(url)
-    doc = feed.items.to(version)
-    doc.write(sys.stdout)
+    feed_cache = None
+    episode_cache = None
+
+    if cache_dir:
+        playback.embeds.cache = Cache(
+            os.path.join(cache_dir, "redirects.sqlite3"),
+            name="redirects",
+            max_entries=settings.REDIRECT_CACHE_MAX_ENTRIES,
+            touch_interval=settings.CACHE_TOUCH_INTERVAL
+        )
+
+        # Skipping unchanged feeds is opt-in, as a skipped export writes
+        # nothing.
+        if skip_unchanged or since_state or watch:
+            feed_cache = Cache(
+                os.path.join(cache_dir, "feeds.sqlite3"),
+                name="feeds",
+                max_entries=settings.FEED_CACHE_MAX_ENTRIES,
+                touch_interval=settings.CACHE_TOUCH_INTERVAL
+            )
+
+        if since_state or watch:
+            episode_cache = Cache(
+                os.path.join(cache_dir, "episodes.sqlite3"),
+                name="episodes",
+                touch_interval=settings.CACHE_TOUCH_INTERVAL
+            )
+
+    elif watch:
+        # Nothing outlives the process, but caches stay warm between polls.
+        playback.embeds.cache = MemoryCache(
+            max_entries=settings.REDIRECT_CACHE_MAX_ENTRIES
+        )
+
+        feed_cache = MemoryCache(max_entries=settings.FEED_CACHE_MAX_ENTRIES)
+        episode_cache = MemoryCache()
+
+    if tracking_prefixes:
+        playback.embeds.add_tracking_prefixes(
+            load_patterns(tracking_prefixes)
+        )
+
+    uploader = None
+    if ghost_url:
+        from .upload import AdminClient, Uploader
+
+        uploader = Uploader(
+            AdminClient(ghost_url, ghost_admin_key, workers=upload_workers),
+            batch_size=batch_size,
+            workers=upload_workers
+        )
+
+    if watch:
+        from .watch import Watcher
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        watcher = Watcher(
+            get_urls((url,) + tuple(urls)),
+            lambda items: write_new_items(
+                items,
+                version,
+                json_backend,
+                uploader,
+                output_dir,
+                compress,
+                compress_level
+            ),
+            cache=feed_cache,
+            episodes=episode_cache,
+            jobs=jobs,
+            stream=stream,
+            max_size=max_feed_size or settings.MAX_FEED_SIZE
+        )
+
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if uploader is not None:
+                uploader.client.close()
+
+        return
+
+    feeds = [
+        Feed(
+            feed_url,
+            jobs=jobs,
+            cache=feed_cache,
+            force=force,
+            episodes=episode_cache,
+            stream=stream,
+            max_size=max_feed_size or settings.MAX_FEED_SIZE
+        ) for feed_url in get_urls((url,) + tuple(urls))
+    ]
+
+    if len(feeds) == 1:
+        items = feeds[0].items
+    else:
+        items = MergedItemList([feed.items for feed in feeds])
+
+    profiler = None
+    stats = None
+
+    if profile:
+        from .profiling import Profiler
+        profiler = Profiler()
+
+    if profile_output:
+        import cProfile
+        stats = cProfile.Profile()
+
+    if profiler is not None:
+        profiler.install()
+
+    if stats is not None:
+        stats.enable()
+
+    try:
+        export(
+            items,
+            version,
+            json_backend,
+            engine,
+            uploader,
+            output_dir,
+            shard_size,
+            shard_bytes,
+            output,
+            compress,
+            compress_level
+        )
+    except FeedTooLarge as ex:
+        raise click.ClickException(f"{ex} is larger than the maximum feed size ({max_feed_size or settings.MAX_FEED_SIZE} bytes).")  # noqa
+    except ParseError as ex:
+        raise click.ClickException(f"Feed is not valid XML: {ex}.")
+    finally:
+        if stats is not None:
+            stats.disable()
+            stats.dump_stats(profile_output)
+
+        if profiler is not None:
+            profiler.uninstall()
+            profiler.report(sys.stderr)
+
+        if uploader is not None:
+            uploader.client.close()
@@ -0,0 +1,138 @@
+"""
+Compressed output module.
+
+Documents are compressed as they're written, a chunk at a time, so the
+uncompressed document never exists in memory or on disk. gzip support is
+built in. zstd support requires the `zstandard` package.
+
+.. currentmodule:: ghostexporter.compression
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from contextlib import contextmanager, suppress
+import io
+import os
+import sys
+
+
+EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst"
+}  #: file extensions for each compression format
+
+DEFAULT_LEVELS = {
+    "gzip": 6,
+    "zstd": 3
+}  #: compression levels used when none is given
+
+LEVEL_RANGES = {
+    "gzip": (1, 9),
+    "zstd": (1, 22)
+}  #: lowest and highest compression levels for each format
+
+
+def get_compression(path: str = None, compression: str = "auto"):
+    """
+    Return the name of a compression format, or `None`.
+
+    When `compression` is "auto", the format is chosen by the extension of
+    `path`.
+    """
+    if compression == "none":
+        return None
+
+    if compression != "auto":
+        return compression
+
+    if path:
+        for name, extension in EXTENSIONS.items():
+            if path.endswith(extension):
+                return name
+
+
+def is_available(compression: str):
+    """Return whether the package needed for a compression format exists."""
+    if compression == "zstd":
+        from importlib.util import find_spec
+
+        return find_spec("zstandard") is not None
+
+    return True
+
+
+def open_compressed(binary, compression: str, level: int = None):
+    """Return a text stream that writes compressed UTF-8 to a binary one."""
+    if level is None:
+        level = DEFAULT_LEVELS[compression]
+
+    if compression == "gzip":
+        import gzip
+
+        # A fixed modification time keeps output reproducible.
+        raw = gzip.GzipFile(
+            fileobj=binary,
+            mode="wb",
+            compresslevel=level,
+            mtime=0
+        )
+    elif compression == "zstd":
+        import zstandard
+
+        raw = zstandard.ZstdCompressor(level=level).stream_writer(
+            binary,
+            closefd=False
+        )
+    else:
+        raise ValueError("Unknown compression format: %s" % compression)
+
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+@contextmanager
+def open_output(path: str = None, compression: str = "auto", level=None):
+    """
+    Open a text stream for writing a document to a file, or to stdout.
+
+    Output is written to stdout when `path` is `None` or "-". See
+    :func:`get_compression` for how the compression format is chosen.
+    Files are written under a temporary name, and only replace `path` once
+    the document is complete.
+    """
+    compression = get_compression(path, compression)
+
+    if path in (None, "-"):
+        if compression is None:
+            yield sys.stdout
+            return
+
+        sys.stdout.flush()
+
+        try:
+            with open_compressed(
+                sys.stdout.buffer,
+                compression,
+                level
+            ) as stream:
+                yield stream
+        finally:
+            sys.stdout.buffer.flush()
+
+        return
+
+    temp = "%s.%d.tmp" % (path, os.getpid())
+
+    try:
+        if compression is None:
+            with open(temp, "w", encoding="utf-8") as f:
+                yield f
+        else:
+            with open(temp, "wb") as binary:
+                with open_compressed(binary, compression, level) as stream:
+                    yield stream
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temp)
+
+        raise
+
+    os.replace(temp, path)
@@ -10,6 +10,11 @@ from ghostexporter import playback
 import re
 
 
+ENCLOSURE_PATTERN = re.compile(
+    r"^https?://media\.transistor\.fm/([^/]+)/[^\.]+\.mp3$.*"
+)
+
+
 @playback.register()
 class TransistorEmbed(playback.EmbedBase):
     """Transistor player embed."""
@@ -18,8 +23,7 @@ class TransistorEmbed(playback.EmbedBase):
 
     def get_embed_url(self, url):
         """Return the iframe URL for a given audio file URL."""
-        return re.sub(
-            r"^https?://media\.transistor\.fm/([^/]+)/[^\.]+\.mp3$.*",
+        return ENCLOSURE_PATTERN.sub(
             r"https://share.transistor.fm/e/\g<1>",
             url
         )
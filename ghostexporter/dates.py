@@ -0,0 +1,184 @@
+"""
+Date parsing module.
+
+Feed dates are almost always RFC 822 (RSS) or RFC 3339 (Atom), so they're
+matched against strict patterns first. Only dates that match neither, and
+that feedparser couldn't parse either, are handed to `dateutil`.
+
+.. currentmodule:: ghostexporter.dates
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import re
+
+
+MONTHS = {
+    name: index + 1 for index, name in enumerate(
+        (
+            "jan", "feb", "mar", "apr", "may", "jun",
+            "jul", "aug", "sep", "oct", "nov", "dec"
+        )
+    )
+}
+
+TIMEZONES = {
+    "UT": timezone.utc,
+    "UTC": timezone.utc,
+    "GMT": timezone.utc,
+    "Z": timezone.utc,
+    "EST": timezone(timedelta(hours=-5)),
+    "EDT": timezone(timedelta(hours=-4)),
+    "CST": timezone(timedelta(hours=-6)),
+    "CDT": timezone(timedelta(hours=-5)),
+    "MST": timezone(timedelta(hours=-7)),
+    "MDT": timezone(timedelta(hours=-6)),
+    "PST": timezone(timedelta(hours=-8)),
+    "PDT": timezone(timedelta(hours=-7))
+}  #: named zones, never modified so threads can share it
+
+RFC822_PATTERN = re.compile(
+    r"^\s*(?:[A-Za-z]{3},?\s+)?(\d{1,2})\s+([A-Za-z]{3})[A-Za-z]*\s+"
+    r"(\d{2}|\d{4})\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*"
+    r"([+-]\d{4}|[A-Za-z]{1,3})?\s*$"
+)
+
+RFC3339_PATTERN = re.compile(
+    r"^\s*(\d{4})-(\d{2})-(\d{2})[Tt ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?"
+    r"([Zz]|[+-]\d{2}:?\d{2})?\s*$"
+)
+
+
+@lru_cache(maxsize=256)
+def get_offset(name: str):
+    """Return the timezone for a numeric offset like `+0100`, or `None`."""
+    if name[0] not in "+-":
+        return None
+
+    digits = name[1:].replace(":", "")
+    if len(digits) != 4 or not digits.isdigit():
+        return None
+
+    offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    if offset >= timedelta(days=1):
+        return None
+
+    return timezone(-offset if name[0] == "-" else offset)
+
+
+def get_timezone(name: str):
+    """
+    Return the timezone for a zone name or numeric offset, or `None`.
+
+    Offsets like `+0100` or `-05:00` are converted once, then cached.
+    """
+    if not name:
+        return timezone.utc
+
+    name = name.upper()
+    if tz := TIMEZONES.get(name):
+        return tz
+
+    return get_offset(name)
+
+
+def parse_rfc822(value: str):
+    """Return a date from an RFC 822 string, or `None` if it isn't one."""
+    match = RFC822_PATTERN.match(value)
+    if match is None:
+        return None
+
+    day, month, year, hour, minute, second, zone = match.groups()
+    month = MONTHS.get(month.lower())
+    tz = get_timezone(zone)
+
+    if month is None or tz is None:
+        return None
+
+    year = int(year)
+    if year < 50:
+        year += 2000
+    elif year < 100:
+        year += 1900
+
+    try:
+        return datetime(
+            year,
+            month,
+            int(day),
+            int(hour),
+            int(minute),
+            int(second or 0),
+            tzinfo=tz
+        )
+    except ValueError:
+        return None
+
+
+def parse_rfc3339(value: str):
+    """Return a date from an RFC 3339 string, or `None` if it isn't one."""
+    match = RFC3339_PATTERN.match(value)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, fraction, zone = match.groups()
+    tz = get_timezone(zone)
+
+    if tz is None:
+        return None
+
+    try:
+        return datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            int((fraction or "0")[:6].ljust(6, "0")),
+            tzinfo=tz
+        )
+    except ValueError:
+        return None
+
+
+def parse_date(value: str, parsed=None):
+    """
+    Return a timezone-aware date from a feed, or `None`.
+
+    Strict RFC 822 and RFC 3339 parsing is tried first, as it keeps the
+    date's original offset. Next, `parsed` (feedparser's UTC
+    `time.struct_time` for the same value) is used if given. `dateutil`
+    is the last resort. Dates without a timezone are assumed to be UTC,
+    so they sort alongside the rest, and item ids derived from them
+    include a `+00:00` offset.
+    """
+    if not value:
+        return None
+
+    if date := parse_rfc822(value) or parse_rfc3339(value):
+        return date
+
+    if parsed is not None:
+        return datetime(*parsed[:6], tzinfo=timezone.utc)
+
+    from dateutil.parser import parse
+
+    try:
+        date = parse(value, tzinfos=TIMEZONES)
+    except (OverflowError, ValueError):
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return date
+
+
+def to_utc(date: datetime):
+    """Return a date converted to UTC. Naive dates are returned as-is."""
+    if date.utcoffset():
+        return date.astimezone(timezone.utc)
+
+    return date
@@ -1,21 +1,50 @@
 """
 Hooks module.
 
+Events emitted during an export:
+
+* `ready`: before anything is fetched.
+* `item_parsed`: with each `item` built from a feed, and its `feed`.
+* `item_transformed`: with each `item` and the `doc` it was transformed
+  into. Listeners may add collections to the document.
+* `redirect_resolved`: with the tracking `url` and the `location` it
+  redirects to, the first time each hop is followed.
+* `document_written`: with the `transformer`, the `stream` written to and
+  the `size` of the document in characters.
+
+Listeners are stored in an immutable tuple per event, so emitting an event
+nothing is listening for costs a single dict lookup.
+
+Async listeners run on the event loop that emitted the event, or on a
+background loop shared by the whole process. :func:`drain` (from a loop)
+or :func:`join` (from anywhere else) waits for them to finish.
+
 .. currentmodule:: ghostexporter.hooks
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from collections import defaultdict
+from concurrent.futures import Future, wait
+from threading import Lock, Thread
+from types import CoroutineType
+import atexit
+import logging
+import os
 
 
-__cache = defaultdict(list)
+logger = logging.getLogger(__name__)
+__listeners = {}
+__lock = Lock()
+__tasks = set()
+__loop = {}  # background event loop, keyed by the process that started it
 
 
 def on(name):
     """Register a function with a callback name."""
 
     def wrapper(func):
-        __cache[name].append(func)
+        with __lock:
+            __listeners[name] = __listeners.get(name, ()) + (func,)
+
         return func
 
     return wrapper
@@ -23,15 +52,126 @@ def on(name):
 
 def off(name, func):
     """Unregister a function with a callback name."""
-    while True:
-        index = __cache[name].index(func)
-        if index > 1:
-            del __cache[name][index]
+    with __lock:
+        listeners = tuple(
+            listener for listener in __listeners.get(name, ())
+            if listener is not func
+        )
+
+        if listeners:
+            __listeners[name] = listeners
         else:
-            break
+            __listeners.pop(name, None)
+
+
+def listening(name):
+    """Return whether any functions are registered with a callback name."""
+    return name in __listeners
+
+
+def get_loop():
+    """
+    Return the background event loop that runs async listeners.
+
+    The loop runs forever in a daemon thread, started the first time it's
+    needed in each process. Listeners still running when the interpreter
+    exits are waited for.
+    """
+    import asyncio
+
+    pid = os.getpid()
+    loop = __loop.get(pid)
+
+    if loop is None:
+        with __lock:
+            loop = __loop.get(pid)
+
+            if loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(
+                    target=loop.run_forever,
+                    name="ghostexporter-hooks",
+                    daemon=True
+                ).start()
+
+                atexit.register(join)
+                __loop.clear()
+                __loop[pid] = loop
+
+    return loop
+
+
+def finished(task):
+    """Forget a finished async listener, logging any error it raised."""
+    __tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Async listener failed.", exc_info=task.exception())
+
+
+def schedule(coro):
+    """
+    Run a coroutine returned by an async listener.
+
+    If an event loop is running in this thread, the coroutine is scheduled
+    as a task on it. Otherwise it is scheduled on the background loop.
+    Either way, it's tracked until it finishes.
+    """
+    import asyncio
+
+    try:
+        task = asyncio.get_running_loop().create_task(coro)
+    except RuntimeError:
+        task = asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+    __tasks.add(task)
+    task.add_done_callback(finished)
+
+
+async def drain():
+    """Wait for async listeners scheduled from this, or no, event loop."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+
+    while pending := [
+        asyncio.wrap_future(task) if isinstance(task, Future) else task
+        for task in list(__tasks)
+        if not task.done() and (
+            isinstance(task, Future) or task.get_loop() is loop
+        )
+    ]:
+        await asyncio.wait(pending)
+
+
+def join(timeout: float = None):
+    """Wait for async listeners running on the background loop."""
+    while pending := [
+        task for task in list(__tasks)
+        if isinstance(task, Future) and not task.done()
+    ]:
+        if wait(pending, timeout).not_done:
+            return
 
 
 def emit(name, **kwargs):
     """Emit an event and run it on hooked functions."""
-    for func in __cache[name]:
-        func(**kwargs)
+    listeners = __listeners.get(name)
+
+    if listeners is None:
+        return
+
+    for func in listeners:
+        result = func(**kwargs)
+
+        if isinstance(result, CoroutineType):
+            schedule(result)
+
+
+async def emit_async(name, **kwargs):
+    """Emit an event, awaiting any async hooked functions in turn."""
+    for func in __listeners.get(name, ()):
+        result = func(**kwargs)
+
+        if isinstance(result, CoroutineType):
+            await result
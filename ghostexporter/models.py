@@ -5,18 +5,16 @@ This is where the business logic for the package lives.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dateutil.parser import parse as parse_date
-from feedparser import parse as parse_feed
-from hashlib import md5
-from pickle import dumps
-from slugify import slugify
-from urllib.parse import quote
-from . import settings
+from hashlib import blake2b, sha256
+from heapq import merge
+from tempfile import SpooledTemporaryFile
+from . import hooks, settings
+from .dates import parse_date
 from .transformers import get_transformer
-import bleach
-import requests
+import json
+import logging
 
 
 ALLOWED_TAGS = [
@@ -33,64 +31,477 @@ ALLOWED_ATTRIBUTES = {
 
 ALLOWED_PROTOCOLS = ["http", "https", "mailto"]
 
+logger = logging.getLogger(__name__)
+
+
+class FeedNotModified(Exception):
+    """Raised when a feed hasn't changed since it was last exported."""
+
+
+class FeedTooLarge(Exception):
+    """Raised when a feed's body exceeds the maximum allowed size."""
+
 
 class ItemList(object):
     """List of feed items."""
 
-    def __init__(self, url: str):
-        """Initialise class with feed URL."""
+    def __init__(
+        self,
+        url: str,
+        jobs: int = 1,
+        cache=None,
+        force: bool = False,
+        episodes=None,
+        stream: bool = False,
+        max_size: int = settings.MAX_FEED_SIZE,
+        session=None
+    ):
+        """
+        Initialise class with feed URL.
+
+        When `jobs` is greater than 1, items are constructed across a pool
+        of that many worker processes.
+
+        When a `cache` is given, the feed's validators and a hash of its body
+        are used to skip feeds that haven't changed since they were last
+        exported, unless `force` is set.
+
+        When an `episodes` cache is given, only entries that are new or have
+        changed since they were last exported are turned into items. One
+        cache can be shared by many feeds.
+
+        When `stream` is set, entries are read one at a time with an
+        incremental parser instead of feedparser. Documents are then written
+        as the feed downloads, one item at a time, and in feed order (see
+        :meth:`iter_items`). Feeds larger than `max_size` bytes are
+        abandoned as soon as that size is exceeded.
+
+        When a `requests.Session` is given, the feed is fetched with it, so
+        connections are reused across feeds.
+        """
         self.__url = url
+        self.__jobs = jobs
+        self.__state_cache = cache
+        self.__force = force
+        self.__state = None
+        self.__episodes = episodes
+        self.__exported = {}
+        self.__stream = stream
+        self.__max_size = max_size
+        self.__session = session
+        self.__response = None
+        self.__previous_state = None
         self.__cache = {}
+        self.__published = []
+
+    @property
+    def url(self):
+        """Return the feed's URL."""
+        return self.__url
+
+    @property
+    def published(self):
+        """
+        Return the publish dates of every entry in the feed.
+
+        Entries skipped because they were already exported are included.
+        """
+        return self.__published
+
+    def request(self):
+        """
+        Send a conditional request for the feed, returning the response.
+
+        Raises :class:`FeedNotModified` if the server responds with a 304,
+        and :class:`FeedTooLarge` if the body is declared to be larger than
+        the maximum size.
+        """
+        headers = {
+            "User-Agent": settings.USER_AGENT
+        }
+
+        state = None
+        if self.__state_cache is not None and not self.__force:
+            state = self.__state_cache.get(self.__url)
+
+        if state:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        import requests
+
+        self.__previous_state = state
+        session = self.__session if self.__session is not None else requests
+        response = session.get(self.__url, headers=headers, stream=True)
+
+        try:
+            if response.status_code == 304:
+                raise FeedNotModified(self.__url)
+
+            response.raise_for_status()
+            length = response.headers.get("Content-Length")
+
+            if self.__max_size and length and int(length) > self.__max_size:
+                raise FeedTooLarge(self.__url)
+        except BaseException:
+            response.close()
+            raise
+
+        return response
+
+    def iter_chunks(self, response):
+        """
+        Yield the body of a response a chunk at a time, then close it.
+
+        Raises :class:`FeedTooLarge` as soon as the body exceeds the maximum
+        size. The feed's state is recorded once the body has been read.
+        """
+        from .streaming import CHUNK_SIZE
+
+        digest = sha256()
+        size = 0
+
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+
+                if self.__max_size and size > self.__max_size:
+                    raise FeedTooLarge(self.__url)
+
+                digest.update(chunk)
+                yield chunk
+        finally:
+            response.close()
+
+        self.__state = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "digest": digest.hexdigest()
+        }
+
+    def fetch(self):
+        """
+        Download the feed body into a spooled temporary file.
+
+        Raises :class:`FeedNotModified` if the server responds with a 304,
+        or the body is identical to the one last exported, and
+        :class:`FeedTooLarge` if the body exceeds the maximum size.
+        """
+        response = self.request()
+        body = SpooledTemporaryFile(settings.FEED_SPOOL_SIZE)
+
+        try:
+            for chunk in self.iter_chunks(response):
+                body.write(chunk)
+
+            state = self.__previous_state
+            if state and state.get("digest") == self.__state["digest"]:
+                raise FeedNotModified(self.__url)
+        except BaseException:
+            body.close()
+            raise
+
+        body.seek(0)
+        return body
+
+    def open(self):
+        """
+        Send the request for a feed whose items are read as they're written.
+
+        Raises :class:`FeedNotModified` if the server responds with a 304.
+        """
+        if self.__response is None:
+            self.__response = self.request()
+
+    def iter_items(self):
+        """
+        Yield items one at a time, as the feed is downloaded and parsed.
+
+        Items are yielded in feed order. Only one entry is held in memory
+        at a time, so the body isn't compared with the one last exported.
+        """
+        from .streaming import iter_chunk_entries
+
+        self.open()
+        response, self.__response = self.__response, None
+        entries = iter_chunk_entries(self.iter_chunks(response))
+
+        for kwargs in self.get_entries(entries):
+            item = build_item(kwargs)
+
+            if hooks.listening("item_parsed"):
+                hooks.emit("item_parsed", item=item, feed=self)
+
+            yield item
 
     def get_feed(self):
         """Return a feedparser feed object."""
-        response = requests.get(
-            self.__url,
-            headers={
-                "User-Agent": settings.USER_AGENT
-            }
-        )
+        with self.fetch() as body:
+            return parse_feed(body)
+
+    def iter_entries(self):
+        """Yield feed entries one at a time, using an incremental parser."""
+        from .streaming import iter_entries
+
+        with self.fetch() as body:
+            yield from iter_entries(body)
+
+    def parse_entries(self, body):
+        """Return an iterable of entries from a fetched feed body."""
+        if self.__stream:
+            from .streaming import iter_entries
+
+            return iter_entries(body)
+
+        return parse_feed(body).entries
+
+    def save_state(self):
+        """Record the fetched feed and its items as exported."""
+        if self.__state_cache is not None and self.__state is not None:
+            self.__state_cache.set(self.__url, self.__state)
+
+        if self.__episodes is not None:
+            for key, fingerprint in self.__exported.items():
+                self.__episodes.set(key, fingerprint)
+
+            self.__exported = {}
+
+    def get_entries(self, entries):
+        """
+        Return item keyword arguments for each feed entry.
+
+        Entries that were already exported, and haven't changed since, are
+        skipped before any item construction cost is paid. So are entries
+        without a valid publish date.
+        """
+        for entry in entries:
+            kwargs = get_item_kwargs(entry)
+
+            if kwargs["published"] is None:
+                logger.warning(
+                    "Skipping entry without a publish date: %s",
+                    kwargs.get("guid") or kwargs["title"]
+                )
+
+                continue
+
+            self.__published.append(kwargs["published"])
+
+            if self.__episodes is not None:
+                key = get_episode_key(
+                    self.__url,
+                    kwargs.get("guid") or kwargs.get("enclosure")
+                )
 
-        response.raise_for_status()
-        return parse_feed(response.content)
+                fingerprint = get_fingerprint(kwargs)
+
+                if self.__episodes.get(key) == fingerprint:
+                    continue
+
+                self.__exported[key] = fingerprint
+
+            yield kwargs
+
+    def build_items(self, kwargs_list):
+        """Return a list of items built from keyword arguments, in order."""
+        if self.__jobs > 1:
+            kwargs_list = list(kwargs_list)
+
+        if self.__jobs > 1 and len(kwargs_list) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            chunksize = max(1, len(kwargs_list) // (self.__jobs * 4))
+
+            with ProcessPoolExecutor(max_workers=self.__jobs) as executor:
+                return list(
+                    executor.map(
+                        build_item,
+                        kwargs_list,
+                        chunksize=chunksize
+                    )
+                )
+
+        return [build_item(kwargs) for kwargs in kwargs_list]
+
+    def read(self, body):
+        """Return a list of items built from a fetched feed body."""
+        return self.build_items(self.get_entries(self.parse_entries(body)))
+
+    def set_items(self, items):
+        """Sort and store the items built from the feed."""
+        items = sorted(items, key=lambda item: item.published)
+
+        if hooks.listening("item_parsed"):
+            for item in items:
+                hooks.emit("item_parsed", item=item, feed=self)
+
+        self.__cache["all"] = items
 
     def all(self):
         """Return a list of feed items."""
         if "all" not in self.__cache:
-            feed = self.get_feed()
-            items = []
+            with self.fetch() as body:
+                self.set_items(self.read(body))
 
-            for entry in feed.entries:
-                kwargs = {
-                    "title": entry.get("itunes_title", entry.get("title")),
-                    "summary": entry.get("summary", ""),
-                    "published": parse_date(entry.published)
-                }
+        return self.__cache["all"]
 
-                for content in entry.get("content", []):
-                    if content.get("type") == "text/html":
-                        kwargs["description"] = content["value"]
+    async def all_async(self, pool):
+        """
+        Return a list of feed items, without blocking the event loop.
 
-                if author := entry.get("author_detail"):
-                    kwargs["author"] = author
+        The feed is fetched via a :class:`ghostexporter.aio.HostPool`,
+        which limits concurrent requests to its host. Parsing and
+        sanitisation then run in one of the pool's threads (and across
+        worker processes when `jobs` is greater than 1).
+        """
+        if "all" not in self.__cache:
+            body = await pool.request(self.__url, self.fetch)
+
+            with body:
+                self.set_items(await pool.run(self.read, body))
 
-                for link in entry.get("links", []):
-                    if link.get("rel") == "enclosure":
-                        kwargs["enclosure"] = link["href"]
-                        break
+        return self.__cache["all"]
 
-                item = Item(**kwargs)
-                items.append(item)
+    def check(self):
+        """
+        Raise :class:`FeedNotModified` if the feed hasn't changed.
+
+        Streamed feeds are only requested, so their items can be read as
+        the document is written.
+        """
+        if self.__stream and "all" not in self.__cache:
+            self.open()
+        else:
+            self.all()
+
+    def to(self, version: str, **kwargs):
+        """
+        Transform the feed item list to a given document format.
+
+        Streamed feeds that haven't been read in full are transformed one
+        item at a time, as they're downloaded.
+        """
+        Transformer = get_transformer(version)
+        items = self.all
 
-            items = sorted(items, key=lambda item: item.published)
-            self.__cache["all"] = items
+        if self.__stream and "all" not in self.__cache:
+            items = self.iter_items
+
+        return Transformer(items, **kwargs)
+
+
+class MergedItems(object):
+    """
+    Iterable of items from several sorted lists, ordered by publish date.
+
+    Items are interleaved with a streaming k-way merge each time the
+    iterable is consumed, rather than by sorting every item at once.
+    """
+
+    def __init__(self, item_lists):
+        """Initialise with a list of sorted item lists."""
+        self.__item_lists = item_lists
+
+    def __iter__(self):
+        """Yield items from all lists in publish order."""
+        return merge(
+            *self.__item_lists,
+            key=lambda item: item.published
+        )
+
+
+class MergedItemList(object):
+    """List of items from several feeds."""
+
+    def __init__(self, item_lists, workers: int = settings.FEED_WORKERS):
+        """
+        Initialise class with a list of :class:`ItemList` objects.
+
+        Feeds are fetched and parsed using at most `workers` threads.
+        """
+        self.__item_lists = item_lists
+        self.__workers = workers
+        self.__cache = {}
+
+    def get_items(self, item_list):
+        """Return the items in a feed, or none if it hasn't changed."""
+        try:
+            return item_list.all()
+        except FeedNotModified:
+            return None
+
+    async def get_items_async(self, item_list, pool):
+        """Return the items in a feed, or none if it hasn't changed."""
+        try:
+            return await item_list.all_async(pool)
+        except FeedNotModified:
+            return None
+
+    def set_items(self, item_lists):
+        """
+        Merge the item lists of feeds that have changed.
+
+        If none of them have, :class:`FeedNotModified` is raised.
+        """
+        item_lists = [items for items in item_lists if items is not None]
+
+        if self.__item_lists and not item_lists:
+            raise FeedNotModified()
+
+        self.__cache["all"] = MergedItems(item_lists)
+
+    def all(self):
+        """
+        Return an iterable of items from all feeds, in publish order.
+
+        Feeds that haven't changed are left out. If none of them have,
+        :class:`FeedNotModified` is raised.
+        """
+        if "all" not in self.__cache:
+            with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+                self.set_items(
+                    executor.map(self.get_items, self.__item_lists)
+                )
+
+        return self.__cache["all"]
+
+    async def all_async(self, pool):
+        """
+        Return an iterable of items from all feeds, in publish order.
+
+        Every feed is fetched concurrently via a
+        :class:`ghostexporter.aio.HostPool`.
+        """
+        if "all" not in self.__cache:
+            import asyncio
+
+            self.set_items(
+                await asyncio.gather(
+                    *(
+                        self.get_items_async(item_list, pool)
+                        for item_list in self.__item_lists
+                    )
+                )
+            )
 
         return self.__cache["all"]
 
-    def to(self, version: str):
-        """Transform the feed item list to a given document format."""
+    def check(self):
+        """Raise :class:`FeedNotModified` if none of the feeds have changed."""
+        self.all()
+
+    def save_state(self):
+        """Record each of the fetched feeds and their items as exported."""
+        for item_list in self.__item_lists:
+            item_list.save_state()
+
+    def to(self, version: str, **kwargs):
+        """Transform the merged item list to a given document format."""
         Transformer = get_transformer(version)
-        transformer = Transformer(self.all)
+        transformer = Transformer(self.all, **kwargs)
 
         return transformer
 
@@ -98,30 +509,133 @@ class ItemList(object):
 class Feed(object):
     """Feed object, containing a list of items."""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, **kwargs):
         """Initialise class with feed URL."""
-        self.items = ItemList(url)
+        self.items = ItemList(url, **kwargs)
+
+
+def parse_feed(body):
+    """Return a feedparser feed object parsed from a feed's body."""
+    from feedparser import parse
+
+    return parse(body)
+
+
+def get_published(entry):
+    """
+    Return the date an entry was published, or `None`.
+
+    The date it was last updated is used if it has no publish date.
+    """
+    for key in ("published", "updated"):
+        if date := parse_date(entry.get(key), entry.get(key + "_parsed")):
+            return date
+
+
+def get_item_kwargs(entry):
+    """Return the keyword arguments used to build an item from an entry."""
+    kwargs = {
+        "title": entry.get("itunes_title", entry.get("title")),
+        "summary": entry.get("summary", ""),
+        "published": get_published(entry)
+    }
+
+    if guid := entry.get("id"):
+        kwargs["guid"] = guid
+
+    for content in entry.get("content", []):
+        if content.get("type") == "text/html":
+            kwargs["description"] = content["value"]
+
+    if author := entry.get("author_detail"):
+        kwargs["author"] = author
+
+    for link in entry.get("links", []):
+        if link.get("rel") == "enclosure":
+            kwargs["enclosure"] = link["href"]
+            break
+
+    return kwargs
+
+
+def sanitise(description: str):
+    """Return show notes with disallowed tags and attributes removed."""
+    from bs4 import BeautifulSoup
+    import bleach
+
+    html = bleach.clean(
+        description,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=ALLOWED_PROTOCOLS,
+        strip=True,
+        strip_comments=True
+    )
+
+    soup = BeautifulSoup(html, "html.parser")
+    return str(soup)
+
+
+def get_item_id(guid: str, enclosure: str, published: datetime):
+    """
+    Return a stable ID for an item.
+
+    The ID is a 128-bit BLAKE2 hash of the item's GUID, enclosure URL and
+    publish date, so it doesn't change when show notes are edited.
+    """
+    canonical = "\n".join(
+        (
+            guid or "",
+            enclosure,
+            published.isoformat()
+        )
+    )
+
+    return blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_episode_key(url: str, guid: str):
+    """Return the key an episode's state is cached under, within its feed."""
+    return json.dumps([url, guid])
+
+
+def get_fingerprint(kwargs):
+    """Return a hash of the content an item would be built from."""
+    serialised = json.dumps(kwargs, sort_keys=True, default=str)
+    return sha256(serialised.encode("utf-8")).hexdigest()
+
+
+def get_slug(title: str):
+    """Return a URL-safe slug for a post title."""
+    from slugify import slugify
+
+    return slugify(title)
+
+
+def build_item(kwargs):
+    """Return an item built from keyword arguments."""
+    return Item(**kwargs)
 
 
 class Item(object):
     """Individiaul feed item."""
 
+    __slots__ = (
+        "created",
+        "id",
+        "guid",
+        "title",
+        "summary",
+        "published",
+        "description",
+        "author",
+        "enclosure",
+        "slug"
+    )
+
     def __init__(self, **kwargs):
         """Initialise item with keyword arguments."""
         self.created = datetime.now()
-        data_serialised = []
-
-        for key in sorted(kwargs.keys()):
-            value = kwargs[key]
-            data_serialised.append(
-                "%s=%s" % (
-                    quote(key),
-                    quote(dumps(value))
-                )
-            )
-
-        data_serialised = "&".join(data_serialised)
-        hashed = md5(data_serialised.encode("utf-8")).hexdigest()
 
         try:
             self.title = kwargs.pop("title")
@@ -130,23 +644,13 @@ class Item(object):
             description = kwargs.pop("description", "")
             self.author = kwargs.pop("author", {})
             self.enclosure = kwargs.pop("enclosure")
+            self.guid = kwargs.pop("guid", None)
         except KeyError as ex:
             raise TypeError("%s is required." % ex.args)
 
         for key in kwargs.keys():
             raise TypeError("Invalid argument: '%s'" % key)
 
-        html = bleach.clean(
-            description,
-            tags=ALLOWED_TAGS,
-            attributes=ALLOWED_ATTRIBUTES,
-            protocols=ALLOWED_PROTOCOLS,
-            strip=True,
-            strip_comments=True
-        )
-
-        soup = BeautifulSoup(html, "html.parser")
-
-        self.id = hashed
-        self.description = str(soup)
-        self.slug = slugify(self.title)
+        self.id = get_item_id(self.guid, self.enclosure, self.published)
+        self.description = sanitise(description)
+        self.slug = get_slug(self.title)
@@ -5,8 +5,8 @@ A module for handling swappable podcast player embeds.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from ghostexporter import hooks, settings, utils
-from importlib import import_module
+from ghostexporter import hooks
+from . import plugins
 from .library import EmbedBase, Library
 
 
@@ -32,11 +32,4 @@ __all__ = (
 
 @hooks.on("ready")
 def ready():
-    for plugin in settings.PLUGINS:
-        name = '%s.player_embeds' % plugin
-
-        try:
-            import_module(name)
-        except ImportError:
-            if utils.module_has_submodule(plugin, "player_embeds"):
-                raise  # pragma: no cover
+    plugins.discover(embeds, embeds.manifest)
@@ -0,0 +1,83 @@
+"""
+Domain index module.
+
+.. currentmodule:: ghostexporter.playback.domains
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+
+EXACT = "\0exact"
+WILDCARD = "\0wildcard"
+
+
+class DomainIndex(object):
+    """
+    Index of values keyed by domain pattern.
+
+    Patterns are stored in a trie of domain labels, read right to left, so
+    a lookup costs one step per label in the host name no matter how many
+    patterns are indexed. A pattern like `example.com` matches that host
+    and `www.example.com`. A pattern like `*.example.com` matches
+    `example.com` and any of its subdomains.
+    """
+
+    def __init__(self, patterns=()):
+        """Initialise the index with an optional iterable of patterns."""
+        self.__root = {}
+
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str, value=True):
+        """Index a value against a domain pattern."""
+        labels = pattern.lower().split(".")
+        kind = EXACT
+
+        if labels[0] == "*":
+            labels = labels[1:]
+            kind = WILDCARD
+
+        node = self.__root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+
+        node.setdefault(kind, []).append(value)
+
+    def find(self, host: str):
+        """Return values matching a host name, most specific first."""
+        labels = host.lower().split(".")
+        node = self.__root
+        found = []
+        remaining = len(labels)
+
+        while remaining:
+            remaining -= 1
+            node = node.get(labels[remaining])
+
+            if node is None:
+                break
+
+            if WILDCARD in node:
+                found.append(node[WILDCARD])
+
+            if EXACT in node and (
+                remaining == 0 or
+                (remaining == 1 and labels[0] == "www")
+            ):
+                found.append(node[EXACT])
+
+        return [value for values in reversed(found) for value in values]
+
+    def __contains__(self, host: str):
+        """Return whether any pattern matches a host name."""
+        return len(self.find(host)) > 0
+
+
+def load_patterns(path: str):
+    """Return domain patterns listed in a file, one per line."""
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+
+            if line:
+                yield line
@@ -5,30 +5,38 @@ Podacst player library module.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from ghostexporter.settings import USER_AGENT
-from urllib.parse import urlparse
-import re
-import requests
-
-
-TRACKING_PREFIXES = (
-    "chrt.fm",
-    "chtbl.com",
-    "claritaspod.com",
-    "*.gum.fm",
-    "mgln.ai",
-    "op3.dev",
-    "p.podderapp.com",
-    "*.podtrac.com",
-    "pdcds.co",
-    "pdcn.co",
-    "pdrl.fm",
-    "pdst.fm",
-    "prfx.byspotify.com",
-    "pscrb.fm",
-    "swap.fm"
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from importlib import import_module
+from ghostexporter import hooks
+from ghostexporter.cache import MISSING
+from ghostexporter.settings import (
+    REDIRECT_CACHE_TTL,
+    REDIRECT_NEGATIVE_CACHE_TTL,
+    REDIRECT_WORKERS,
+    USER_AGENT
 )
 
+from threading import Lock
+from urllib.parse import urlsplit
+from .domains import DomainIndex, load_patterns
+import os
+import sys
+
+
+TRACKING_PREFIXES_FILE = os.path.join(
+    os.path.dirname(__file__),
+    "tracking_prefixes.txt"
+)
+
+TRACKING_PREFIXES = tuple(load_patterns(TRACKING_PREFIXES_FILE))
+
+
+@lru_cache(maxsize=None)
+def get_domain_index(domains: tuple):
+    """Return a compiled index for a tuple of domain patterns."""
+    return DomainIndex(domains)
+
 
 class EmbedBase(object):
     """Base embed class."""
@@ -36,15 +44,8 @@ class EmbedBase(object):
     def apply(self, url):
         """Determine whether this player can resolve the given URL."""
         if domains := getattr(self, "domains", None):
-            enclosure_domain = urlparse(url).netloc
-
-            for domain in domains:
-                ex = domain.replace("*", ".*")
-
-                if re.match(ex, enclosure_domain) is not None:
-                    return True
-
-            return False
+            host = urlsplit(url).hostname or ""
+            return host in get_domain_index(tuple(domains))
 
         raise NotImplementedError  # pragma: no cover
 
@@ -65,53 +66,271 @@ class Library(object):
 
     def __init__(self):
         """Initialise the library."""
-        self.__players = []
+        self.__players = DomainIndex()
+        self.__fallbacks = []
+        self.__plugins = DomainIndex()
+        self.__registered = {}
+        self.__tracking = DomainIndex(TRACKING_PREFIXES)
+        self.__hops = {}
+        self.__lock = Lock()
+        self.cache = None
+        self.session = None
+        self.manifest = None
 
     def register(self, parser):
-        """Register a player class with the library."""
-        self.__players.append(parser)
+        """
+        Register a player class with the library.
+
+        A single instance of the player is created, and indexed against each
+        of its domains. Players without a `domains` attribute are checked
+        via their own :meth:`EmbedBase.apply` method, after indexed players.
+        """
+        player = parser()
+        registered = self.__registered.setdefault(
+            parser.__module__,
+            {"domains": [], "fallback": False}
+        )
+
+        if domains := getattr(player, "domains", None):
+            for domain in domains:
+                self.__players.add(domain, player)
+
+            registered["domains"].extend(domains)
+        else:
+            self.__fallbacks.append(player)
+            registered["fallback"] = True
+
+    def get_registered(self, module: str):
+        """Return the domains handled by the players a module registered."""
+        return self.__registered.get(
+            module,
+            {"domains": [], "fallback": False}
+        )
+
+    def add_plugin(self, module: str, domains):
+        """
+        Index a plugin module against its players' domains.
+
+        The module isn't imported until a URL matches one of the domains,
+        at which point its players register themselves.
+        """
+        for domain in domains:
+            self.__plugins.add(domain, module)
+
+    def get_players(self, url):
+        """Return the players that can resolve a URL, best match first."""
+        host = urlsplit(url).hostname or ""
+
+        for module in self.__plugins.find(host):
+            if module not in sys.modules:
+                import_module(module)
+
+        players = self.__players.find(host)
+
+        for player in self.__fallbacks:
+            if player.apply(url):
+                players.append(player)
+
+        return players
+
+    def add_tracking_prefixes(self, prefixes):
+        """Add domain patterns to the list of known tracking prefixes."""
+        for prefix in prefixes:
+            self.__tracking.add(prefix)
 
     def is_tracking_url(self, url):
         """Return whether a URL has a tracking prefix."""
-        domain = urlparse(url).netloc
-        for prefix_domain in TRACKING_PREFIXES:
-            pattern = r"^(?:www\.)?" + prefix_domain.replace(
-                ".", "\\."
-            ).replace(
-                "*\\.",
-                "(?:[^\\.]+\\.)?"
-            ) + "$"
+        return (urlsplit(url).hostname or "") in self.__tracking
+
+    def follow(self, url):
+        """Return the URL a tracking URL redirects to, or `None`."""
+        import requests
+
+        session = self.session if self.session is not None else requests
+        response = session.head(
+            url,
+            headers={
+                "User-Agent": USER_AGENT
+            }
+        )
+
+        if response.status_code not in (301, 302):
+            return None
+
+        return response.headers["Location"]
+
+    def get_cached_hop(self, url):
+        """
+        Return the next hop for a tracking URL, via the persistent cache.
+
+        Non-redirect responses are cached too, for a shorter time, so that
+        re-exporting an unchanged feed makes no requests at all.
+        """
+        if self.cache is None:
+            return self.follow(url)
+
+        location = self.cache.get(url, MISSING)
+        if location is not MISSING:
+            return location
+
+        location = self.follow(url)
+        self.cache.set(
+            url,
+            location,
+            ttl=(
+                REDIRECT_CACHE_TTL
+                if location is not None
+                else REDIRECT_NEGATIVE_CACHE_TTL
+            )
+        )
 
-            match = re.search(pattern, domain)
+        return location
 
-            if match is not None:
-                return True
+    def claim_hop(self, url):
+        """
+        Return a future for the next hop of a tracking URL.
 
-        return False
+        Also returns whether the caller is the first to ask for this URL,
+        and so is responsible for settling the future.
+        """
+        with self.__lock:
+            future = self.__hops.get(url)
+            owner = future is None
+
+            if owner:
+                future = self.__hops[url] = Future()
+
+        return future, owner
+
+    def reset_hops(self):
+        """
+        Forget the hops looked up so far.
+
+        Long-running processes call this between exports, so lookups go
+        back to the persistent cache, which honours its expiry times.
+        """
+        with self.__lock:
+            self.__hops = {}
+
+    def settle_hop(self, url, future):
+        """Look up the next hop for a tracking URL, and settle its future."""
+        try:
+            location = self.get_cached_hop(url)
+        except Exception as ex:
+            # Failures aren't remembered, so the next lookup tries again.
+            with self.__lock:
+                if self.__hops.get(url) is future:
+                    del self.__hops[url]
+
+            future.set_exception(ex)
+        else:
+            future.set_result(location)
+
+            if location is not None:
+                hooks.emit(
+                    "redirect_resolved",
+                    url=url,
+                    location=location
+                )
+
+    def get_hop(self, url):
+        """
+        Return the next hop for a tracking URL.
+
+        Each URL is only ever requested once. Concurrent lookups for the same
+        URL wait on the first one rather than making their own request.
+        """
+        future, owner = self.claim_hop(url)
+
+        if owner:
+            self.settle_hop(url, future)
+
+        return future.result()
+
+    async def get_hop_async(self, url, pool):
+        """
+        Return the next hop for a tracking URL, without blocking.
+
+        The request is made via a :class:`ghostexporter.aio.HostPool`.
+        Lookups are shared with :meth:`get_hop`.
+        """
+        import asyncio
+
+        future, owner = self.claim_hop(url)
+
+        if owner:
+            await pool.request(url, self.settle_hop, url, future)
+
+        return await asyncio.wrap_future(future)
 
     def strip_tracking(self, url):
         """Remove tracking prefixes from URLs."""
         while self.is_tracking_url(url):
-            response = requests.head(
-                url,
-                headers={
-                    "User-Agent": USER_AGENT
-                }
-            )
+            location = self.get_hop(url)
 
-            if response.status_code not in (301, 302):
+            if location is None:
                 break
 
-            url = response.headers["Location"]
+            url = location
 
         return url
 
+    async def strip_tracking_async(self, url, pool):
+        """Remove tracking prefixes from URLs, without blocking."""
+        while self.is_tracking_url(url):
+            location = await self.get_hop_async(url, pool)
+
+            if location is None:
+                break
+
+            url = location
+
+        return url
+
+    def get_tracking_urls(self, urls):
+        """Return the unique URLs in an iterable with tracking prefixes."""
+        return [
+            url for url in dict.fromkeys(urls)
+            if url and self.is_tracking_url(url)
+        ]
+
+    def resolve(self, urls, workers: int = REDIRECT_WORKERS):
+        """
+        Strip tracking prefixes from a batch of URLs up front.
+
+        Redirect chains are followed concurrently using at most `workers`
+        threads. Later calls to :meth:`strip_tracking` for these URLs are
+        answered without making any further requests.
+        """
+        urls = self.get_tracking_urls(urls)
+
+        if not urls:
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(self.strip_tracking, urls):
+                pass
+
+    async def resolve_async(self, urls, pool):
+        """
+        Strip tracking prefixes from a batch of URLs, without blocking.
+
+        Every redirect chain is followed concurrently, with requests to each
+        host limited by a :class:`ghostexporter.aio.HostPool`.
+        """
+        import asyncio
+
+        await asyncio.gather(
+            *(
+                self.strip_tracking_async(url, pool)
+                for url in self.get_tracking_urls(urls)
+            )
+        )
+
     def get_html(self, enclosure):
         """Return an HTML string for a given audio file URL."""
         enc = self.strip_tracking(enclosure)
 
-        for Player in self.__players:
-            player = Player()
-            if player.apply(enc):
-                if html := player.get_embed_html(enc):
-                    return html
+        for player in self.get_players(enc):
+            if html := player.get_embed_html(enc):
+                return html
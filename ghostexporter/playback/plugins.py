@@ -0,0 +1,223 @@
+"""
+Player plugin discovery module.
+
+Players are provided by plugin modules: the `player_embeds` module of each
+package in `settings.PLUGINS`, and any module registered by another package
+under the `ghostexporter.players` entry point group, for example::
+
+    entry_points={
+        "ghostexporter.players": [
+            "myhost = myhost_ghostexporter.player_embeds"
+        ]
+    }
+
+When a cache directory is given, the domains handled by each plugin's
+players are saved to a manifest. On later runs, a plugin is only imported
+once an enclosure matches one of its domains. The manifest is rebuilt
+whenever the set of installed plugins, their versions, or the modification
+time or size of their source files change. Nothing is imported to check.
+
+.. currentmodule:: ghostexporter.playback.plugins
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from ghostexporter import settings, utils
+from ghostexporter.version import __version__
+from importlib import import_module
+import json
+import os
+import sys
+
+
+ENTRY_POINT_GROUP = "ghostexporter.players"
+MANIFEST_VERSION = 3
+
+
+def get_entry_points():
+    """Return the entry points registered for player plugins."""
+    from importlib.metadata import entry_points
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        return found.select(group=ENTRY_POINT_GROUP)
+
+    return found.get(ENTRY_POINT_GROUP, ())  # pragma: no cover
+
+
+def find_source(name: str, dist=None):
+    """
+    Return the path to a plugin module's source file, or `None`.
+
+    The file is looked for among those installed by the module's
+    distribution, if given, then on `sys.path`. Nothing is imported.
+    """
+    path = name.replace(".", "/")
+    candidates = (path + ".py", path + "/__init__.py")
+
+    if dist is not None:
+        for file in dist.files or ():
+            if file.as_posix() in candidates:
+                return str(dist.locate_file(file))
+
+    for entry in sys.path:
+        for candidate in candidates:
+            filename = os.path.join(entry or ".", *candidate.split("/"))
+
+            if os.path.isfile(filename):
+                return filename
+
+    return None
+
+
+def get_source_stamp(name: str, dist=None):
+    """
+    Return the modification time and size of a plugin module's source.
+
+    Returns `None` if the module's source file can't be found.
+    """
+    filename = find_source(name, dist)
+    if filename is None:
+        return None
+
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    return "%d-%d" % (stat.st_mtime_ns, stat.st_size)
+
+
+def get_plugins():
+    """
+    Return a dict of plugin module names, and their package versions.
+
+    Each version is followed by the modification time and size of the
+    module's source, so that a plugin whose players change without a new
+    release is noticed.
+    """
+    plugins = {}
+
+    for package in settings.PLUGINS:
+        name = "%s.player_embeds" % package
+        plugins[name] = "%s:%s" % (__version__, get_source_stamp(name))
+
+    for entry_point in get_entry_points():
+        dist = getattr(entry_point, "dist", None)
+        name = entry_point.value.split(":", 1)[0].strip()
+        plugins[name] = "%s:%s" % (
+            dist.version if dist is not None else None,
+            get_source_stamp(name, dist)
+        )
+
+    return plugins
+
+
+def load_plugin(name: str):
+    """
+    Import a plugin module, returning whether it exists.
+
+    Packages listed in `settings.PLUGINS` don't have to provide players, so
+    a missing `player_embeds` module is skipped. Errors raised while
+    importing a module that does exist are not.
+    """
+    try:
+        import_module(name)
+    except ImportError:
+        package, submodule = name.rsplit(".", 1)
+
+        try:
+            package = import_module(package)
+        except ImportError:
+            package = None
+
+        if utils.module_has_submodule(package, submodule):
+            raise  # pragma: no cover
+
+        return False
+
+    return True
+
+
+def read_manifest(path: str, plugins: dict):
+    """Return the players saved in a manifest, or `None` if it's stale."""
+    try:
+        with open(path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+
+    if manifest.get("plugins") != plugins:
+        return None
+
+    return manifest.get("players")
+
+
+def write_manifest(path: str, plugins: dict, players: dict):
+    """
+    Save the players each plugin provides to a manifest.
+
+    The manifest is written to a temporary file first, so processes starting
+    at the same time never read one that's half written.
+    """
+    temp_path = "%s.%d" % (path, os.getpid())
+
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with open(temp_path, "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "plugins": plugins,
+                    "players": players
+                },
+                f,
+                indent=4
+            )
+
+        os.replace(temp_path, path)
+    except OSError:  # pragma: no cover
+        pass
+
+
+def build_manifest(library, plugins: dict):
+    """Import every plugin, returning the domains each one's players handle."""
+    players = {}
+
+    for name in plugins:
+        if load_plugin(name):
+            players[name] = library.get_registered(name)
+
+    return players
+
+
+def discover(library, path: str = None):
+    """
+    Register plugins with a player library.
+
+    Plugins listed in an up-to-date manifest at `path` are indexed against
+    their domains and imported on demand. Otherwise every plugin is
+    imported, and the manifest is saved for next time.
+    """
+    plugins = get_plugins()
+    players = read_manifest(path, plugins) if path else None
+
+    if players is None:
+        players = build_manifest(library, plugins)
+
+        if path:
+            write_manifest(path, plugins, players)
+
+        return
+
+    for name, registered in players.items():
+        if name in sys.modules:
+            continue
+
+        if registered["fallback"]:
+            load_plugin(name)
+        else:
+            library.add_plugin(name, registered["domains"])
@@ -0,0 +1,236 @@
+"""
+Profiling module.
+
+Instruments the stages of an export by wrapping the functions that run
+them. Nothing is wrapped until a :class:`Profiler` is installed, so there is
+no overhead when profiling is off.
+
+.. currentmodule:: ghostexporter.profiling
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from collections import defaultdict
+from functools import wraps
+from inspect import isgeneratorfunction
+from threading import local
+from time import perf_counter
+import math
+
+
+STAGES = (
+    "fetch",
+    "download",
+    "parse",
+    "redirects",
+    "resolve",
+    "sanitise",
+    "embeds",
+    "transform",
+    "encode",
+    "write",
+    "upload"
+)  #: stages of an export, in the order they're reported
+
+
+def percentile(values, percent: float):
+    """Return the nearest-rank percentile of a sorted list of values."""
+    if not values:
+        return 0.0
+
+    rank = max(1, math.ceil(percent / 100 * len(values)))
+    return values[rank - 1]
+
+
+class Profiler(object):
+    """
+    Records wall time and call counts for each stage of an export.
+
+    Each stage's time includes any other stages it runs, except for
+    "encode", which is the time spent writing documents (or preparing
+    posts to upload) once every other stage is taken away. Generators,
+    like the incremental parser, are timed while they're running, and
+    recorded once they finish.
+    """
+
+    def __init__(self):
+        """Initialise the profiler."""
+        self.timings = defaultdict(list)
+        self.bytes_fetched = 0
+        self.__patches = []
+        self.__local = local()
+        self.__started = None
+        self.__finished = None
+
+    def get_targets(self):
+        """Return the functions to instrument, and their stage names."""
+        from . import models, streaming
+        from .playback.library import Library
+        from .transformers.base import JSONTransformer
+        from .transformers.v5 import Ghost5Transformer
+        from .upload import AdminClient, Uploader
+
+        return (
+            (models.ItemList, "request", "fetch"),
+            (models.ItemList, "iter_chunks", "download"),
+            (models, "parse_feed", "parse"),
+            (streaming, "iter_chunk_entries", "parse"),
+            (Library, "follow", "redirects"),
+            (Library, "resolve", "resolve"),
+            (models, "sanitise", "sanitise"),
+            (streaming, "sanitise", "sanitise"),
+            (Library, "get_html", "embeds"),
+            (Ghost5Transformer, "transform_item", "transform"),
+            (JSONTransformer, "serialise_item", "encode"),
+            (JSONTransformer, "write_document", "write"),
+            (Uploader, "get_posts", "encode"),
+            (AdminClient, "request", "upload")
+        )
+
+    def start(self):
+        """Start timing a call, within any call already being timed."""
+        self.__local.__dict__.setdefault("stack", []).append(0.0)
+        return perf_counter()
+
+    def stop(self, started: float):
+        """
+        Stop timing a call.
+
+        Returns how long the call took, and how long it took once the time
+        spent in calls it made to other stages is taken away.
+        """
+        elapsed = perf_counter() - started
+        stack = self.__local.stack
+        own = elapsed - stack.pop()
+
+        if stack:
+            stack[-1] += elapsed
+
+        return elapsed, own
+
+    def record(self, stage: str, elapsed: float, own: float):
+        """Record how long a call to a stage took."""
+        if stage != "encode":
+            self.timings[stage].append(elapsed)
+
+        if stage in ("encode", "write"):
+            self.timings["encode"].append(own)
+
+    def wrap_generator(self, original, stage: str):
+        """
+        Return a generator function that records how long one takes.
+
+        Only time spent producing values is recorded, not time spent by
+        whatever consumes them.
+        """
+        profiler = self
+
+        @wraps(original)
+        def wrapper(*args, **kwargs):
+            generator = original(*args, **kwargs)
+            elapsed = own = 0.0
+
+            try:
+                while True:
+                    started = profiler.start()
+
+                    try:
+                        value = next(generator)
+                    except StopIteration:
+                        break
+                    finally:
+                        times = profiler.stop(started)
+                        elapsed += times[0]
+                        own += times[1]
+
+                    if stage == "download":
+                        profiler.bytes_fetched += len(value)
+
+                    yield value
+            finally:
+                generator.close()
+                profiler.record(stage, elapsed, own)
+
+        return wrapper
+
+    def wrap(self, owner, name: str, stage: str):
+        """Replace a function with one that records how long it takes."""
+        original = owner.__dict__[name]
+        profiler = self
+
+        if isgeneratorfunction(original):
+            wrapper = self.wrap_generator(original, stage)
+        else:
+            @wraps(original)
+            def wrapper(*args, **kwargs):
+                started = profiler.start()
+
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    profiler.record(stage, *profiler.stop(started))
+
+        setattr(owner, name, wrapper)
+        self.__patches.append((owner, name, original))
+
+    def install(self):
+        """Start instrumenting the export."""
+        for owner, name, stage in self.get_targets():
+            self.wrap(owner, name, stage)
+
+        self.__started = perf_counter()
+
+    def uninstall(self):
+        """Stop instrumenting the export, restoring the original functions."""
+        self.__finished = perf_counter()
+
+        while self.__patches:
+            owner, name, original = self.__patches.pop()
+            setattr(owner, name, original)
+
+    def get_stats(self):
+        """Return a dict of statistics for each stage that ran."""
+        stats = {}
+
+        for stage in STAGES:
+            timings = self.timings.get(stage)
+            if not timings:
+                continue
+
+            timings = sorted(timings)
+            stats[stage] = {
+                "calls": len(timings),
+                "total": sum(timings),
+                "p50": percentile(timings, 50),
+                "p90": percentile(timings, 90),
+                "p99": percentile(timings, 99),
+                "max": timings[-1]
+            }
+
+        return stats
+
+    def report(self, stream):
+        """Write a breakdown of time spent in each stage to a stream."""
+        finished = self.__finished or perf_counter()
+        wall = finished - (self.__started or finished)
+        stats = self.get_stats()
+
+        stream.write(
+            "%-10s %8s %10s %10s %10s %10s %10s\n" % (
+                "stage", "calls", "total (s)",
+                "p50 (ms)", "p90 (ms)", "p99 (ms)", "max (ms)"
+            )
+        )
+
+        for stage, stat in stats.items():
+            stream.write("%-10s %8d %10.3f" % (stage, stat["calls"], stat["total"]))  # noqa
+
+            for key in ("p50", "p90", "p99", "max"):
+                if key in stat:
+                    stream.write(" %10.3f" % (stat[key] * 1000))
+                else:
+                    stream.write(" %10s" % "-")
+
+            stream.write("\n")
+
+        stream.write("wall time: %.3fs\n" % wall)
+        stream.write("bytes fetched: %d\n" % self.bytes_fetched)
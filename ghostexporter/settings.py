@@ -8,6 +8,31 @@ Settings module.
 from .version import __version__
 
 USER_AGENT = "ghostexporter/%s" % __version__
+FEED_WORKERS = 8
+FEED_SPOOL_SIZE = 1024 * 1024
+MAX_FEED_SIZE = None
+REDIRECT_WORKERS = 8
+ASYNC_WORKERS = 32
+HOST_CONNECTIONS = 4
+UPLOAD_BATCH_SIZE = 50
+UPLOAD_WORKERS = 4
+UPLOAD_RETRIES = 5
+UPLOAD_BACKOFF = 0.5
+UPLOAD_MAX_DELAY = 60
+UPLOAD_TIMEOUT = 30
+REDIRECT_CACHE_TTL = 60 * 60 * 24 * 30
+REDIRECT_NEGATIVE_CACHE_TTL = 60 * 60 * 24
+REDIRECT_CACHE_MAX_ENTRIES = 100000
+FEED_CACHE_MAX_ENTRIES = 10000
+CACHE_TIMEOUT = 30
+CACHE_TOUCH_INTERVAL = 60 * 60
+CACHE_EVICTION_BATCH = 0.05
+BATCH_START_METHOD = None
+WATCH_MIN_INTERVAL = 5 * 60
+WATCH_MAX_INTERVAL = 6 * 60 * 60
+WATCH_DEFAULT_INTERVAL = 30 * 60
+WATCH_POLLS_PER_EPISODE = 24
+WATCH_SAMPLE_SIZE = 10
 PLUGINS = [
     "ghostexporter.contrib.buzzsprout",
     "ghostexporter.contrib.transistor"
@@ -0,0 +1,179 @@
+"""
+Incremental feed parsing module.
+
+Reads RSS 2.0 and Atom feeds from a file-like object a chunk at a time,
+yielding one entry at a time, so that memory use is proportional to the
+largest episode rather than the whole feed.
+
+.. currentmodule:: ghostexporter.streaming
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from feedparser import FeedParserDict
+from xml.etree.ElementTree import XMLPullParser
+from .models import sanitise
+
+
+CHUNK_SIZE = 64 * 1024  #: number of bytes fed to the parser at a time
+
+ATOM = "http://www.w3.org/2005/Atom"
+CONTENT = "http://purl.org/rss/1.0/modules/content/"
+ITUNES = "http://www.itunes.com/dtds/podcast-1.0.dtd"
+
+ENTRY_TAGS = ("item", "{%s}entry" % ATOM)
+
+
+def get_text(element, tag):
+    """Return the stripped text of a child element, or `None`."""
+    child = element.find(tag)
+
+    if child is not None and child.text is not None:
+        return child.text.strip()
+
+
+def parse_rss_item(element):
+    """Return a feedparser-style entry from an RSS `<item>` element."""
+    entry = FeedParserDict()
+
+    if title := get_text(element, "title"):
+        entry["title"] = title
+
+    if title := get_text(element, "{%s}title" % ITUNES):
+        entry["itunes_title"] = title
+
+    if guid := get_text(element, "guid"):
+        entry["id"] = guid
+
+    if published := get_text(element, "pubDate"):
+        entry["published"] = published
+
+    summary = get_text(element, "description")
+    if summary is None:
+        summary = get_text(element, "{%s}summary" % ITUNES)
+
+    if summary is not None:
+        entry["summary"] = sanitise(summary)
+
+    if content := get_text(element, "{%s}encoded" % CONTENT):
+        entry["content"] = [
+            FeedParserDict(type="text/html", value=content)
+        ]
+
+    author = get_text(element, "{%s}author" % ITUNES)
+    if author is None:
+        author = get_text(element, "author")
+
+    if author:
+        entry["author"] = author
+        entry["author_detail"] = FeedParserDict(name=author)
+
+    links = []
+    if link := get_text(element, "link"):
+        links.append(
+            FeedParserDict(rel="alternate", type="text/html", href=link)
+        )
+
+    for enclosure in element.iterfind("enclosure"):
+        if href := enclosure.get("url"):
+            links.append(
+                FeedParserDict(
+                    rel="enclosure",
+                    type=enclosure.get("type", ""),
+                    length=enclosure.get("length", ""),
+                    href=href
+                )
+            )
+
+    entry["links"] = links
+    return entry
+
+
+def parse_atom_entry(element):
+    """Return a feedparser-style entry from an Atom `<entry>` element."""
+    entry = FeedParserDict()
+
+    if title := get_text(element, "{%s}title" % ATOM):
+        entry["title"] = title
+
+    if title := get_text(element, "{%s}title" % ITUNES):
+        entry["itunes_title"] = title
+
+    if guid := get_text(element, "{%s}id" % ATOM):
+        entry["id"] = guid
+
+    published = get_text(element, "{%s}published" % ATOM)
+    if published is None:
+        published = get_text(element, "{%s}updated" % ATOM)
+
+    if published is not None:
+        entry["published"] = published
+
+    if summary := get_text(element, "{%s}summary" % ATOM):
+        entry["summary"] = sanitise(summary)
+
+    if content := get_text(element, "{%s}content" % ATOM):
+        entry["content"] = [
+            FeedParserDict(type="text/html", value=content)
+        ]
+
+    if author := get_text(element, "{%s}author/{%s}name" % (ATOM, ATOM)):
+        entry["author"] = author
+        entry["author_detail"] = FeedParserDict(name=author)
+
+    entry["links"] = [
+        FeedParserDict(
+            rel=link.get("rel", "alternate"),
+            type=link.get("type", ""),
+            href=link.get("href")
+        ) for link in element.iterfind("{%s}link" % ATOM)
+        if link.get("href")
+    ]
+
+    return entry
+
+
+def read_chunks(stream, chunk_size: int = CHUNK_SIZE):
+    """Yield the contents of a file-like object, a chunk at a time."""
+    while chunk := stream.read(chunk_size):
+        yield chunk
+
+
+def iter_entries(stream, chunk_size: int = CHUNK_SIZE):
+    """Yield feedparser-style entries from a file-like object."""
+    return iter_chunk_entries(read_chunks(stream, chunk_size))
+
+
+def iter_chunk_entries(chunks):
+    """
+    Yield feedparser-style entries from a feed, one at a time.
+
+    The feed is read from an iterable of chunks (eg: the body of a response
+    as it downloads). Each `<item>` or `<entry>` element is discarded once
+    it has been read. Unlike feedparser, the feed must be well-formed XML.
+    Summaries are sanitised as feedparser would.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    parents = []
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+        for event, element in parser.read_events():
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if element.tag not in ENTRY_TAGS:
+                continue
+
+            if element.tag == "item":
+                yield parse_rss_item(element)
+            else:
+                yield parse_atom_entry(element)
+
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+    parser.close()
@@ -5,9 +5,95 @@ Base classes for document conversion.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
-from collections import defaultdict
 from datetime import datetime
+from ghostexporter import hooks
+from ghostexporter.dates import to_utc
+from json.encoder import encode_basestring, encode_basestring_ascii
+from tempfile import SpooledTemporaryFile
 import json
+import re
+
+
+SPOOL_SIZE = 1024 * 1024  #: bytes of secondary collections held in memory
+CHUNK_SIZE = 64 * 1024  #: size of chunks copied out of spooled collections
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"  #: format of dates in documents
+FIELD_MARKER = "\0%s\0"
+FIELD_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+
+class RawJSON(str):
+    """A string of already-serialised JSON, written to documents as-is."""
+
+
+class JSONSerialiser(object):
+    """
+    Standard library serialisation backend.
+
+    Strings and documents are encoded with the C accelerated parts of the
+    `json` module. Dates are formatted directly rather than through an
+    encoder callback.
+    """
+
+    name = "json"
+
+    def encode_string(self, value: str):
+        """Return a string as an ASCII-only JSON string."""
+        return encode_basestring_ascii(value)
+
+    def encode_date(self, value: datetime):
+        """Return a date as a JSON string, in UTC."""
+        return '"%s.000Z"' % to_utc(value).isoformat(timespec="seconds")[:19]
+
+
+class ORJSONSerialiser(JSONSerialiser):
+    """
+    `orjson` serialisation backend.
+
+    ASCII strings are encoded by `orjson`, which is considerably faster than
+    the standard library. Strings `orjson` would encode differently (ie:
+    those with non-ASCII or delete characters) fall back to the standard
+    library, so output is identical.
+
+    Dates aren't handed to `orjson`, as it can't produce Ghost's format
+    (with milliseconds and no offset). They're formatted the same way as
+    the standard library backend.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        """Import the `orjson` package."""
+        import orjson
+        self.__dumps = orjson.dumps
+
+    def encode_string(self, value: str):
+        """Return a string as an ASCII-only JSON string."""
+        if value.isascii() and "\x7f" not in value:
+            return self.__dumps(value).decode("ascii")
+
+        return encode_basestring_ascii(value)
+
+
+SERIALISERS = {
+    serialiser.name: serialiser
+    for serialiser in (JSONSerialiser, ORJSONSerialiser)
+}
+
+
+def get_serialiser(name: str = None):
+    """
+    Return an instance of a named serialisation backend.
+
+    When no name is given (or the name is "auto"), the fastest installed
+    backend is used.
+    """
+    if name and name != "auto":
+        return SERIALISERS[name]()
+
+    try:
+        return ORJSONSerialiser()
+    except ImportError:
+        return JSONSerialiser()
 
 
 class ItemsHook(object):
@@ -18,36 +104,73 @@ class ItemsHook(object):
     an iterable of items that need to be transformed.
     """
 
-    def __init__(self, items_getter: callable, item_transformer: callable):
+    def __init__(
+        self,
+        items_getter: callable,
+        item_transformer: callable,
+        items_preparer: callable = None
+    ):
         """
         Class initialiser.
 
         Initialise the hook with the function used to return items,
-        and the function used to transform individual items.
+        the function used to transform individual items, and an optional
+        function that is given the full list of items before any of them
+        are transformed.
         """
         self.__hook = items_getter
         self.__transformer = item_transformer
+        self.__preparer = items_preparer
 
     def transform(self):
         """Transform individual items obtained via the getter."""
-        for item in self.__hook():
-            yield self.__transformer(item)
+        items = self.__hook()
+
+        if self.__preparer is not None:
+            self.__preparer(items)
+
+        for item in items:
+            doc = self.__transformer(item)
+            hooks.emit("item_transformed", item=item, doc=doc)
+            yield doc
+
+
+class TransformedHook(ItemsHook):
+    """Item hook over documents for items that were already transformed."""
+
+    def __init__(self, docs):
+        """Initialise the hook with a list of item documents."""
+        super().__init__(lambda: docs, None)
+        self.__docs = docs
+
+    def transform(self):
+        """Yield the item documents."""
+        return iter(self.__docs)
 
 
 class TransformerBase(object):
     """Base transformer."""
 
-    def __init__(self, items_callabke: callable):
-        """Initialise with an iterable to get feed items."""
+    def __init__(self, items_callabke: callable, serialiser: str = None):
+        """
+        Initialise with an iterable to get feed items.
+
+        `serialiser` names the JSON backend used to write documents.
+        """
+        self.encoder = GhostEncoder(serialiser=get_serialiser(serialiser))
         self.items_hook = ItemsHook(
             items_callabke,
-            self.transform_item
+            self.transform_item,
+            self.prepare_items
         )
 
     def transform_items(self, item_hook: callable):
         """Create a document that will contain items."""
         raise NotImplementedError  # pragma: no cover
 
+    def prepare_items(self, items):
+        """Do any batch work needed before items are transformed."""
+
     def transform_item(self, item):
         """Create a document that contains an individual item."""
         raise NotImplementedError  # pragma: no cover
@@ -60,27 +183,365 @@ class TransformerBase(object):
 class GhostEncoder(json.JSONEncoder):
     """JSON encoder for streaming feed items and handling dates."""
 
+    def __init__(self, *args, serialiser: JSONSerialiser = None, **kwargs):
+        """Initialise the encoder with a serialisation backend."""
+        super().__init__(*args, **kwargs)
+        self.serialiser = serialiser or JSONSerialiser()
+
     def default(self, value):
-        """Handle streamable content and transform dates."""
+        """Transform dates."""
+        if isinstance(value, datetime):
+            return to_utc(value).strftime(DATE_FORMAT)
+
+    def encode_value(self, value):
+        """Return the JSON representation of a single value."""
+        if isinstance(value, RawJSON):
+            return value
+
+        if isinstance(value, str):
+            if self.ensure_ascii:
+                return self.serialiser.encode_string(value)
+
+            return encode_basestring(value)
+
+        if isinstance(value, datetime):
+            return self.serialiser.encode_date(value)
+
+        return self.encode_doc(value)
+
+    def encode_doc(self, doc):
+        """
+        Return the JSON representation of a document in one go.
+
+        Documents filled from a :class:`Template` are rendered from it,
+        unless their keys or static values have since been changed.
+        """
+        if isinstance(doc, TemplateDoc) and doc.template.matches(doc):
+            return doc.template.render_doc(self, doc)
+
+        return "".join(json.JSONEncoder.iterencode(self, doc, True))
+
+    def iterencode(self, value, _one_shot=False):
+        """
+        Encode a value, yielding its JSON representation in chunks.
+
+        Dicts and lists are walked here so that any :class:`ItemsHook`
+        found within the document can be streamed, rather than collected
+        into memory before the first byte is written.
+        """
         if isinstance(value, ItemsHook):
-            collections = defaultdict(list)
-            for item in value.transform():
+            yield from self.iterencode_items(value)
+        elif isinstance(value, RawJSON):
+            yield value
+        elif isinstance(value, TemplateDoc):
+            yield self.encode_doc(value)
+        elif isinstance(value, dict):
+            yield "{"
+            for index, (key, child) in enumerate(value.items()):
+                if index:
+                    yield self.item_separator
+
+                yield self.encode(key) + self.key_separator
+                yield from self.iterencode(child)
+
+            yield "}"
+        elif isinstance(value, (list, tuple)):
+            yield "["
+            for index, child in enumerate(value):
+                if index:
+                    yield self.item_separator
+
+                yield from self.iterencode(child)
+
+            yield "]"
+        else:
+            yield from super().iterencode(value, _one_shot)
+
+    def iterencode_items(self, hook: ItemsHook):
+        """
+        Stream the collections of transformed items as a JSON object.
+
+        Documents belonging to the first collection (ie: posts) are
+        written as soon as each item is transformed. Other collections
+        are spooled to a temporary file and copied out once every item has
+        been seen, so memory use stays bounded however long the feed is.
+        """
+        primary = None
+        written = 0
+        spools = {}
+
+        try:
+            for item in hook.transform():
                 for collection, docs in item.items():
-                    collections[collection].extend(docs)
+                    if primary is None:
+                        primary = collection
+                        yield "{" + self.encode(collection)
+                        yield self.key_separator + "["
 
-            return collections
+                    if collection == primary:
+                        for doc in docs:
+                            if written:
+                                yield self.item_separator
 
-        if isinstance(value, datetime):
-            return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                            if isinstance(doc, RawJSON):
+                                yield doc
+                            else:
+                                yield self.encode_doc(doc)
+
+                            written += 1
+
+                        continue
+
+                    if collection not in spools:
+                        spools[collection] = [
+                            SpooledTemporaryFile(SPOOL_SIZE, mode="w+"),
+                            0
+                        ]
+
+                    spool = spools[collection]
+                    for doc in docs:
+                        if spool[1]:
+                            spool[0].write(self.item_separator)
+
+                        if isinstance(doc, RawJSON):
+                            spool[0].write(doc)
+                        else:
+                            spool[0].write(self.encode_doc(doc))
+
+                        spool[1] += 1
+
+            if primary is None:
+                yield "{}"
+                return
+
+            yield "]"
+
+            for collection, (spool, count) in spools.items():
+                yield self.item_separator + self.encode(collection)
+                yield self.key_separator + "["
+                spool.seek(0)
+
+                while chunk := spool.read(CHUNK_SIZE):
+                    yield chunk
+
+                yield "]"
+
+            yield "}"
+        finally:
+            for spool, count in spools.values():
+                spool.close()
+
+
+class TemplateDoc(dict):
+    """
+    A document filled from a :class:`Template`.
+
+    It can be read and changed like any other dict. When it's encoded, the
+    template is used to serialise it, as long as it still matches.
+    """
+
+    __slots__ = ("template",)
+
+
+class Template(object):
+    """
+    Pre-serialised JSON document.
+
+    The static parts of the document are serialised once, when the template
+    is created. Values for each field (created with :meth:`field`) are then
+    encoded and spliced in by :meth:`render`.
+
+    Templates whose fields are all top-level values can also be filled as a
+    :class:`TemplateDoc`, with :meth:`fill`. That way, consumers work with
+    plain dicts, and the template is only applied when they're written.
+    """
+
+    def __init__(self, doc):
+        """Serialise a document containing field placeholders."""
+        parts = FIELD_PATTERN.split(GhostEncoder().encode(doc))
+        self.__static = parts[0::2]
+        self.__fields = parts[1::2]
+        self.__doc = doc
+        self.__keys = list(doc)
+        self.__field_keys = {}
+        self.__static_values = {}
+
+        for key, value in doc.items():
+            match = isinstance(value, str) and FIELD_PATTERN.fullmatch(
+                json.dumps(value)
+            )
+
+            if match:
+                self.__field_keys[key] = match.group(1)
+            else:
+                self.__static_values[key] = value
+
+    def fill(self, **values):
+        """Return a document with the given field values."""
+        doc = TemplateDoc(
+            (
+                key,
+                values[self.__field_keys[key]]
+                if key in self.__field_keys
+                else self.__doc[key]
+            )
+            for key in self.__keys
+        )
+
+        doc.template = self
+        return doc
+
+    def matches(self, doc: dict):
+        """Return whether a document can still be rendered by the template."""
+        return list(doc) == self.__keys and all(
+            doc[key] == value
+            for key, value in self.__static_values.items()
+        )
+
+    def render_doc(self, encoder: GhostEncoder, doc: dict):
+        """Return a document filled from the template as JSON."""
+        return self.render(
+            encoder,
+            **{
+                field: doc[key]
+                for key, field in self.__field_keys.items()
+            }
+        )
+
+    @staticmethod
+    def field(name: str):
+        """Return a placeholder for a named field."""
+        return FIELD_MARKER % name
+
+    def render(self, encoder: GhostEncoder, **values):
+        """Return the document as JSON, with the given field values."""
+        encode = encoder.encode_value
+        chunks = [self.__static[0]]
+
+        for name, static in zip(self.__fields, self.__static[1:]):
+            chunks.append(encode(values[name]))
+            chunks.append(static)
+
+        return RawJSON("".join(chunks))
 
 
 class JSONTransformer(TransformerBase):
     """Base JSON transformer."""
 
+    def write_document(self, stream, item_hook: ItemsHook):
+        """Write a document containing the items from a hook to a stream."""
+        doc = self.transform_items(item_hook)
+        size = 0
+
+        for chunk in self.encoder.iterencode(doc):
+            stream.write(chunk)
+            size += len(chunk)
+
+        hooks.emit(
+            "document_written",
+            transformer=self,
+            stream=stream,
+            size=size
+        )
+
     def write(self, stream):
         """Transform the feed items and write to a stream."""
-        json.dump(
-            self.transform_items(self.items_hook),
-            stream,
-            cls=GhostEncoder
+        self.write_document(stream, self.items_hook)
+
+    def serialise_item(self, doc: dict):
+        """Return an item's document, with every value serialised to JSON."""
+        return {
+            collection: [
+                value if isinstance(value, RawJSON)
+                else RawJSON(self.encoder.encode_doc(value))
+                for value in values
+            ]
+            for collection, values in doc.items()
+        }
+
+    def get_envelope_size(self):
+        """Return the length of a document containing no items."""
+        return sum(
+            len(chunk) for chunk in self.encoder.iterencode(
+                self.transform_items(TransformedHook([]))
+            )
         )
+
+    def get_item_size(self, doc: dict, counts: dict):
+        """
+        Return how much an item's document adds to the length of a document.
+
+        `counts` is the number of documents already in each collection.
+        """
+        key_separator = len(self.encoder.key_separator) + 2
+        item_separator = len(self.encoder.item_separator)
+        size = 0
+        collections = len(counts)
+
+        for collection, values in doc.items():
+            count = counts.get(collection)
+
+            if count is None:
+                size += len(self.encoder.encode(collection)) + key_separator
+                size += item_separator if collections else 0
+                collections += 1
+                count = 0
+
+            for value in values:
+                size += len(value) + (item_separator if count else 0)
+                count += 1
+
+        return size
+
+    def write_shards(
+        self,
+        open_shard: callable,
+        max_items: int = None,
+        max_size: int = None
+    ):
+        """
+        Transform the feed items and write them across several documents.
+
+        Each document holds at most `max_items` items, and is at most
+        `max_size` characters long (unless a single item is larger).
+        `open_shard` is called with the index of each document, and must
+        return a writable stream, used as a context manager. Documents are
+        written as soon as they fill. Returns the number written.
+        """
+        envelope = self.get_envelope_size()
+        written = 0
+        docs = []
+        counts = {}
+        size = envelope
+
+        for doc in self.items_hook.transform():
+            doc = self.serialise_item(doc)
+            item_size = self.get_item_size(doc, counts)
+            full = docs and (
+                (max_items and len(docs) >= max_items) or
+                (max_size and size + item_size > max_size)
+            )
+
+            if full:
+                with open_shard(written) as stream:
+                    self.write_document(stream, TransformedHook(docs))
+
+                written += 1
+                docs = []
+                counts = {}
+                size = envelope
+                item_size = self.get_item_size(doc, counts)
+
+            for collection, values in doc.items():
+                counts[collection] = counts.get(collection, 0) + len(values)
+
+            docs.append(doc)
+            size += item_size
+
+        if docs or not written:
+            with open_shard(written) as stream:
+                self.write_document(stream, TransformedHook(docs))
+
+            written += 1
+
+        return written
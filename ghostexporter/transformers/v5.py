@@ -5,10 +5,48 @@ Contains the v5 Ghost data transformer.
 .. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
 """
 
+from collections.abc import Iterator
 from datetime import datetime
 from ghostexporter.playback import embeds
-from .base import JSONTransformer
-import json
+from .base import JSONTransformer, Template
+
+
+LEXICAL_TEMPLATE = Template(
+    {
+        "root": {
+            "children": [
+                {
+                    "type": "html",
+                    "html": Template.field("html"),
+                    "version": 1
+                }
+            ],
+            "type": "root"
+        }
+    }
+)
+
+POST_TEMPLATE = Template(
+    {
+        "id": Template.field("id"),
+        "slug": Template.field("slug"),
+        "title": Template.field("title"),
+        "html": Template.field("html"),
+        "lexical": Template.field("lexical"),
+        "type": "post",
+        "status": "published",
+        "visibility": "public",
+        "created_at": Template.field("created_at"),
+        "published_at": Template.field("published_at")
+    }
+)
+
+POSTS_AUTHORS_TEMPLATE = Template(
+    {
+        "post_id": Template.field("id"),
+        "author_id": "1"
+    }
+)
 
 
 class Ghost5Transformer(JSONTransformer):
@@ -24,6 +62,18 @@ class Ghost5Transformer(JSONTransformer):
         html.append(item.description)
         return "\n\n".join(html)
 
+    def prepare_items(self, items):
+        """
+        Resolve tracking redirects for every enclosure in one batch.
+
+        Items that can only be read once (ie: a streamed feed) are left
+        alone, and resolved one at a time as they're transformed.
+        """
+        if isinstance(items, Iterator):
+            return
+
+        embeds.resolve(item.enclosure for item in items)
+
     def transform_items(self, item_hook: callable):
         """Create a Ghost document with metadata and item list."""
         now = datetime.now()
@@ -41,43 +91,33 @@ class Ghost5Transformer(JSONTransformer):
             ]
         }
 
-    def get_lexical(self, item):
-        """Return a Lexical document from an item."""
-        return {
-            "root": {
-                "children": [
-                    {
-                        "type": "html",
-                        "html": self.build_content(item),
-                        "version": 1
-                    }
-                ],
-                "type": "root"
-            }
-        }
+    def get_lexical(self, html: str):
+        """Return a serialised Lexical document containing post HTML."""
+        return LEXICAL_TEMPLATE.render(self.encoder, html=html)
 
     def transform_item(self, item):
-        """Transform a feed item into a JSON object."""
-        lexical = self.get_lexical(item)
+        """
+        Transform a feed item into a JSON object.
+
+        The post's content is rendered once, and spliced into a
+        pre-serialised Lexical document. Post documents are filled from
+        templates, which are used to serialise them when they're written.
+        """
+        html = self.build_content(item)
+
         return {
             "posts": [
-                {
-                    "id": item.id,
-                    "slug": item.slug,
-                    "title": item.title,
-                    "html": self.build_content(item),
-                    "lexical": json.dumps(lexical),
-                    "type": "post",
-                    "status": "published",
-                    "visibility": "public",
-                    "created_at": item.created,
-                    "published_at": item.published
-                }
+                POST_TEMPLATE.fill(
+                    id=item.id,
+                    slug=item.slug,
+                    title=item.title,
+                    html=html,
+                    lexical=str(self.get_lexical(html)),
+                    created_at=item.created,
+                    published_at=item.published
+                )
             ],
             "posts_authors": [
-                {
-                    "post_id": item.id,
-                    "author_id": "1"
-                }
+                POSTS_AUTHORS_TEMPLATE.fill(id=item.id)
             ]
         }
@@ -0,0 +1,346 @@
+"""
+Ghost Admin API upload module.
+
+An output target that sends transformed posts straight to a Ghost site,
+instead of writing a document to import by hand. Posts are uploaded in
+batches. Posts that already exist (matched by slug) are updated rather than
+duplicated, so an upload that fails part way through can be run again.
+
+.. currentmodule:: ghostexporter.upload
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from base64 import urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from . import settings
+from .dates import to_utc
+from .transformers.base import DATE_FORMAT
+import hashlib
+import hmac
+import json
+import random
+import time
+
+
+API_PATH = "/ghost/api/admin"
+API_VERSION = "v5.0"
+TOKEN_LIFETIME = 5 * 60  #: seconds an Admin API token is valid for
+
+POST_FIELDS = (
+    "title",
+    "slug",
+    "lexical",
+    "status",
+    "visibility",
+    "published_at"
+)  #: fields of a transformed post sent to the Admin API
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class UploadError(Exception):
+    """Raised when the Admin API rejects a request, or can't be reached."""
+
+
+class UncertainUploadError(UploadError):
+    """Raised when a request failed, but may have reached the Admin API."""
+
+
+def is_unsent(ex):
+    """Return whether a request failed before it reached the server."""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(ex, requests.ConnectTimeout):
+        return True
+
+    reason = getattr(ex.args[0] if ex.args else None, "reason", None)
+    return isinstance(reason, NewConnectionError)
+
+
+def b64(value: bytes):
+    """Return unpadded URL-safe Base64."""
+    return urlsafe_b64encode(value).rstrip(b"=").decode("ascii")
+
+
+def get_field(value):
+    """Return a post field's value, as sent to the Admin API."""
+    if isinstance(value, datetime):
+        return to_utc(value).strftime(DATE_FORMAT)
+
+    return value
+
+
+def get_token(key: str, now: float = None):
+    """
+    Return a signed token for an Admin API key.
+
+    Keys are in the form `id:secret`, where the secret is hex-encoded.
+    """
+    key_id, secret = key.split(":", 1)
+    now = int(now if now is not None else time.time())
+
+    header = {"alg": "HS256", "typ": "JWT", "kid": key_id}
+    payload = {"iat": now, "exp": now + TOKEN_LIFETIME, "aud": "/admin/"}
+    signing_input = "%s.%s" % (
+        b64(json.dumps(header, separators=(",", ":")).encode("utf-8")),
+        b64(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    )
+
+    signature = hmac.new(
+        bytes.fromhex(secret),
+        signing_input.encode("ascii"),
+        hashlib.sha256
+    ).digest()
+
+    return "%s.%s" % (signing_input, b64(signature))
+
+
+class AdminClient(object):
+    """
+    Ghost Admin API client.
+
+    Requests share a pool of up to `workers` connections. Failed requests
+    (connection errors, rate limiting and server errors) are retried up to
+    `retries` times, waiting exponentially longer, from `backoff` seconds,
+    between attempts.
+
+    Requests that aren't idempotent (ie: creating a post) are only retried
+    when they can't have reached the server. Otherwise
+    :class:`UncertainUploadError` is raised, and the caller must check
+    whether the request took effect.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        workers: int = settings.UPLOAD_WORKERS,
+        retries: int = settings.UPLOAD_RETRIES,
+        backoff: float = settings.UPLOAD_BACKOFF,
+        timeout: float = settings.UPLOAD_TIMEOUT
+    ):
+        """Initialise the client with a site URL and Admin API key."""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.__url = url.rstrip("/") + API_PATH
+        self.__key = key
+        self.__token = None
+        self.__token_expires = 0
+        self.retries = retries
+        self.__backoff = backoff
+        self.__timeout = timeout
+        self.__session = requests.Session()
+        self.__session.mount(
+            "http://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        )
+
+        self.__session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        )
+
+        self.__session.headers.update(
+            {
+                "Accept-Version": API_VERSION,
+                "User-Agent": settings.USER_AGENT
+            }
+        )
+
+    def get_token(self):
+        """Return a token, signing a new one shortly before it expires."""
+        now = time.time()
+
+        if now >= self.__token_expires - 60:
+            self.__token = get_token(self.__key, now)
+            self.__token_expires = now + TOKEN_LIFETIME
+
+        return self.__token
+
+    def get_delay(self, attempt: int, response=None):
+        """Return how long to wait before retrying a request."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+
+            if retry_after.isdigit():
+                return min(float(retry_after), settings.UPLOAD_MAX_DELAY)
+
+        delay = self.__backoff * (2 ** attempt)
+        return delay + random.uniform(0, delay / 2)
+
+    def request(self, method: str, path: str, **kwargs):
+        """Make a request to the Admin API, returning its decoded body."""
+        import requests
+
+        idempotent = method != "POST"
+        attempt = 0
+
+        while True:
+            response = None
+            error = None
+            retry = True
+
+            try:
+                response = self.__session.request(
+                    method,
+                    self.__url + path,
+                    headers={"Authorization": "Ghost %s" % self.get_token()},
+                    timeout=self.__timeout,
+                    **kwargs
+                )
+            except requests.RequestException as ex:
+                error = str(ex)
+                retry = idempotent or is_unsent(ex)
+            else:
+                if response.status_code < 400:
+                    return response.json()
+
+                error = "%s %s returned %d: %s" % (
+                    method,
+                    path,
+                    response.status_code,
+                    response.text[:200]
+                )
+
+                if response.status_code not in RETRY_STATUSES:
+                    raise UploadError(error)
+
+                retry = idempotent or response.status_code == 429
+
+            if not retry:
+                raise UncertainUploadError(error)
+
+            if attempt >= self.retries:
+                raise UploadError(error)
+
+            time.sleep(self.get_delay(attempt, response))
+            attempt += 1
+
+    def find_posts(self, slugs):
+        """Return a dict of existing posts, keyed by slug."""
+        if not slugs:
+            return {}
+
+        body = self.request(
+            "GET",
+            "/posts/",
+            params={
+                "filter": "slug:[%s]" % ",".join(slugs),
+                "fields": "id,slug,updated_at",
+                "limit": "all"
+            }
+        )
+
+        return {post["slug"]: post for post in body.get("posts", [])}
+
+    def create_post(self, post: dict):
+        """Create a post, returning it."""
+        body = self.request("POST", "/posts/", json={"posts": [post]})
+        return body["posts"][0]
+
+    def update_post(self, existing: dict, post: dict):
+        """Update an existing post, returning it."""
+        post = dict(post, updated_at=existing["updated_at"])
+        body = self.request(
+            "PUT",
+            "/posts/%s/" % existing["id"],
+            json={"posts": [post]}
+        )
+
+        return body["posts"][0]
+
+    def close(self):
+        """Close the client's pooled connections."""
+        self.__session.close()
+
+
+class Uploader(object):
+    """
+    Uploads transformed posts to the Admin API in batches.
+
+    Each batch of `batch_size` posts is checked for existing slugs with one
+    request. Its posts are then created or updated concurrently.
+    """
+
+    def __init__(
+        self,
+        client: AdminClient,
+        batch_size: int = settings.UPLOAD_BATCH_SIZE,
+        workers: int = settings.UPLOAD_WORKERS
+    ):
+        """Initialise the uploader with an API client."""
+        self.client = client
+        self.created = 0
+        self.updated = 0
+        self.__batch_size = batch_size
+        self.__workers = workers
+
+    def get_posts(self, transformer):
+        """Yield the post fields of each item a transformer produces."""
+        for doc in transformer.items_hook.transform():
+            for post in doc.get("posts", []):
+                yield {
+                    field: get_field(post[field])
+                    for field in POST_FIELDS
+                    if field in post
+                }
+
+    def upsert(self, post: dict, existing: dict):
+        """
+        Create a post, or update it if one with its slug exists.
+
+        If creating the post fails in a way that means it may have been
+        created anyway, its slug is looked up again before trying again.
+        """
+        attempt = 0
+
+        while existing is None:
+            try:
+                self.client.create_post(post)
+                return False
+            except UncertainUploadError:
+                if attempt >= self.client.retries:
+                    raise
+
+            time.sleep(self.client.get_delay(attempt))
+            attempt += 1
+            existing = self.client.find_posts([post["slug"]]).get(
+                post["slug"]
+            )
+
+        self.client.update_post(existing, post)
+        return True
+
+    def upload_batch(self, executor, posts):
+        """Create or update a batch of posts."""
+        # Posts sharing a slug would be created at the same time, and
+        # collide. Only the last is kept, as it would replace the others.
+        posts = list({post["slug"]: post for post in posts}.values())
+        existing = self.client.find_posts([post["slug"] for post in posts])
+
+        for updated in executor.map(
+            lambda post: self.upsert(post, existing.get(post["slug"])),
+            posts
+        ):
+            if updated:
+                self.updated += 1
+            else:
+                self.created += 1
+
+    def upload(self, transformer):
+        """Upload every post a transformer produces."""
+        batch = []
+
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            for post in self.get_posts(transformer):
+                batch.append(post)
+
+                if len(batch) >= self.__batch_size:
+                    self.upload_batch(executor, batch)
+                    batch = []
+
+            if batch:
+                self.upload_batch(executor, batch)
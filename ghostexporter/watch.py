@@ -0,0 +1,143 @@
+"""
+Watch mode module.
+
+Keeps a schedule of feeds, and polls each one with conditional requests.
+How often a feed is polled depends on how often it publishes episodes.
+When a feed has new or changed episodes, only those are exported.
+
+Everything is kept in one long-running process, so the plugin registry,
+redirect lookups and caches stay warm between polls.
+
+.. currentmodule:: ghostexporter.watch
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+"""
+
+from statistics import median
+from . import settings
+from .cache import MemoryCache
+from .models import FeedNotModified, ItemList
+from .playback import embeds
+import heapq
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_interval(published, polls: int = settings.WATCH_POLLS_PER_EPISODE):
+    """
+    Return how many seconds to wait before polling a feed again.
+
+    The interval is the median gap between a feed's most recent episodes,
+    divided by `polls`, so that a new episode is noticed in reasonable
+    time.
+    """
+    dates = sorted(published)[-settings.WATCH_SAMPLE_SIZE:]
+    gaps = [
+        (later - earlier).total_seconds()
+        for earlier, later in zip(dates, dates[1:])
+    ]
+
+    gaps = [gap for gap in gaps if gap > 0]
+    if not gaps:
+        return settings.WATCH_DEFAULT_INTERVAL
+
+    return min(
+        max(median(gaps) / polls, settings.WATCH_MIN_INTERVAL),
+        settings.WATCH_MAX_INTERVAL
+    )
+
+
+class Watcher(object):
+    """
+    Polls a schedule of feeds, exporting new episodes as they appear.
+
+    `export` is called with an :class:`ItemList` containing only the
+    episodes that are new or changed since the last poll. Feed and episode
+    state is kept in `cache` and `episodes`. If these aren't given, state
+    is kept in memory, and every episode is exported on the first poll.
+    Other keyword arguments are passed to each :class:`ItemList`.
+    """
+
+    def __init__(
+        self,
+        urls,
+        export: callable,
+        cache=None,
+        episodes=None,
+        clock: callable = time.time,
+        sleep: callable = time.sleep,
+        **kwargs
+    ):
+        """Initialise the watcher with a list of feed URLs."""
+        self.__export = export
+        self.__cache = cache if cache is not None else MemoryCache()
+        self.__episodes = episodes if episodes is not None else MemoryCache()
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__kwargs = kwargs
+        self.__intervals = {}
+        self.__schedule = []
+
+        now = clock()
+        for index, url in enumerate(dict.fromkeys(urls)):
+            heapq.heappush(self.__schedule, (now, index, url))
+
+    def get_interval(self, url: str):
+        """Return the current polling interval for a feed, in seconds."""
+        return self.__intervals.get(url, settings.WATCH_DEFAULT_INTERVAL)
+
+    def poll(self, url: str):
+        """
+        Fetch a feed, and export any new episodes.
+
+        Returns the number of episodes exported. Errors are logged, and the
+        feed is polled again after a longer interval.
+        """
+        embeds.reset_hops()
+        items = ItemList(
+            url,
+            cache=self.__cache,
+            episodes=self.__episodes,
+            **self.__kwargs
+        )
+
+        try:
+            new = items.all()
+            self.__intervals[url] = get_interval(items.published)
+
+            if new:
+                self.__export(items)
+        except FeedNotModified:
+            return 0
+        except Exception:
+            # State isn't saved, so the same episodes are tried again.
+            logger.exception("Failed to export %s", url)
+            self.__intervals[url] = min(
+                self.get_interval(url) * 2,
+                settings.WATCH_MAX_INTERVAL
+            )
+
+            return 0
+
+        items.save_state()
+        return len(new)
+
+    def run(self, polls: int = None):
+        """Poll feeds as they fall due, forever or for a number of polls."""
+        while self.__schedule and (polls is None or polls > 0):
+            due, index, url = heapq.heappop(self.__schedule)
+            wait = due - self.__clock()
+
+            if wait > 0:
+                self.__sleep(wait)
+
+            self.poll(url)
+            heapq.heappush(
+                self.__schedule,
+                (self.__clock() + self.get_interval(url), index, url)
+            )
+
+            if polls is not None:
+                polls -= 1
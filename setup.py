@@ -38,7 +38,7 @@ setup(
     name="podcast-ghost-exporter",
     description="A command-line utility for creating Ghost-compatible JSON documents for importing podcast content.",
     long_description=long_description,
-    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
+    packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests", "benchmarks", "benchmarks.*"]),
     version=version,
     install_requires=[
         "beautifulsoup4>=4,<5",
@@ -50,6 +50,10 @@ setup(
         "PyTZ",
         "requests>=2,<3"
     ],
+    extras_require={
+        "orjson": ["orjson>=3,<4"],
+        "zstd": ["zstandard>=0.21"]
+    },
     entry_points="""
     [console_scripts]
     ghostexporter=ghostexporter.cli:cli
@@ -0,0 +1,130 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_aio
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's asyncio export engine.
+"""
+
+from ghostexporter import aio, hooks
+from ghostexporter.models import ItemList
+from threading import Lock
+from .utils import mock_http
+import asyncio
+import io
+import json
+import time
+
+
+def get_posts(doc: str):
+    """Return the posts in a document, without their creation dates."""
+    posts = json.loads(doc)["db"][0]["data"]["posts"]
+
+    for post in posts:
+        post.pop("created_at")
+
+    return posts
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_export():
+    """
+    Export a feed with the asyncio engine.
+
+    Arrange: Export a feed with the synchronous engine.
+    Act: Export the same feed with the asyncio engine.
+    Assert: Both documents contain the same posts.
+    """
+    url = "https://feeds.buzzsprout.com/156239.rss"
+    expected = io.StringIO()
+    ItemList(url).to("5").write(expected)
+
+    stream = io.StringIO()
+    asyncio.run(aio.export(ItemList(url), stream))
+
+    assert get_posts(stream.getvalue()) == get_posts(
+        expected.getvalue()
+    ), "Documents differ between engines."
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_export_drains_listeners():
+    """
+    Export a feed with async listeners that await.
+
+    Arrange: Register async listeners for items and the written document.
+    Act: Export a feed with the asyncio engine.
+    Assert: Every listener has finished by the time the export returns.
+    """
+    calls = []
+
+    async def listener(**kwargs):
+        await asyncio.sleep(0.01)
+        calls.append(kwargs.get("size"))
+
+    hooks.on("item_parsed")(listener)
+    hooks.on("document_written")(listener)
+
+    try:
+        asyncio.run(
+            aio.export(
+                ItemList("https://feeds.buzzsprout.com/156239.rss"),
+                io.StringIO()
+            )
+        )
+    finally:
+        hooks.off("item_parsed", listener)
+        hooks.off("document_written", listener)
+
+    assert len(calls) == 11, "Listeners not awaited."
+    assert calls[-1] > 0, "Document listener not awaited."
+
+
+def test_host_limits():
+    """
+    Limit concurrent requests to each host.
+
+    Arrange: Create a pool allowing two connections per host.
+    Act: Make several slow requests to two hosts at once.
+    Assert: No more than two requests to a host run at a time, but the
+    hosts are requested concurrently.
+    """
+    lock = Lock()
+    active = {}
+    peaks = {}
+
+    def request(host):
+        with lock:
+            active[host] = active.get(host, 0) + 1
+            peaks[host] = max(peaks.get(host, 0), active[host])
+
+        time.sleep(0.02)
+
+        with lock:
+            active[host] -= 1
+
+    async def main():
+        pool = aio.HostPool(connections=2)
+
+        try:
+            await asyncio.gather(
+                *(
+                    pool.request("https://%s/%d" % (host, index), request, host)  # noqa
+                    for host in ("a.example.com", "b.example.com")
+                    for index in range(6)
+                )
+            )
+        finally:
+            pool.close()
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+
+    assert peaks == {
+        "a.example.com": 2,
+        "b.example.com": 2
+    }, "Per-host limit not applied."
+
+    assert elapsed < 0.2, "Hosts not requested concurrently."
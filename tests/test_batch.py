@@ -0,0 +1,58 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_batch
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's batch export module.
+"""
+
+from contextlib import contextmanager
+from ghostexporter.batch import BatchRunner
+from io import StringIO
+from unittest.mock import patch
+from .utils import FakeResponse, make_feed
+import json
+
+
+def get(session, url, **kwargs):
+    """Return a feed with as many episodes as the number in its URL."""
+    count = int(url.rsplit("/", 1)[-1].split(".")[0])
+    return FakeResponse(200, {}, make_feed(count))
+
+
+def test_batch():
+    """
+    Export a catalogue of feeds across worker processes.
+
+    Arrange: Mock GET requests for feeds of different lengths. Workers are
+    forked, so they inherit the mock.
+    Act: Write one combined document, then one document per feed.
+    Assert: Every feed's posts are written once, in either layout.
+    """
+    urls = ["https://example.com/%d.xml" % count for count in (3, 1, 5, 2)]
+    stream = StringIO()
+    feeds = {}
+
+    @contextmanager
+    def open_feed(index: int, url: str):
+        feeds[index] = StringIO()
+        yield feeds[index]
+
+    with patch("requests.Session.get", get):
+        BatchRunner(urls, processes=2, start_method="fork").write(stream)
+        BatchRunner(urls, processes=2, start_method="fork").write_feeds(
+            open_feed
+        )
+
+    posts = json.loads(stream.getvalue())["db"][0]["data"]["posts"]
+    assert sorted(post["title"] for post in posts) == sorted(
+        "Episode %d" % number
+        for count in (3, 1, 5, 2)
+        for number in range(1, count + 1)
+    ), "Incorrect posts."
+
+    assert {
+        index: len(json.loads(f.getvalue())["db"][0]["data"]["posts"])
+        for index, f in feeds.items()
+    } == {0: 3, 1: 1, 2: 5, 3: 2}, "Incorrect documents per feed."
@@ -0,0 +1,62 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_benchmarks
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's benchmark suite.
+"""
+
+from benchmarks.domains import (
+    URLS,
+    benchmark_domains,
+    index_match,
+    linear_match
+)
+
+from benchmarks.runner import STAGES, benchmark
+from ghostexporter.playback.domains import DomainIndex
+from ghostexporter.playback.library import TRACKING_PREFIXES
+import json
+
+
+def test_benchmark():
+    """
+    Benchmark a tiny synthetic feed.
+
+    Arrange/Act: Run a single benchmark of a feed with a few episodes.
+    Assert: Every stage is timed and measured, and results are serialisable.
+    """
+    results = benchmark(episodes=3, notes_size=256, repeat=1)
+
+    assert list(results["stages"].keys()) == list(STAGES), "Stages missing."
+    assert all(
+        stage["seconds"] > 0 and stage["peak_bytes"] > 0
+        for stage in results["stages"].values()
+    ), "Stage not measured."
+
+    json.dumps(results)
+
+
+def test_benchmark_domains():
+    """
+    Benchmark the domain index against a linear scan.
+
+    Arrange: Index the tracking prefixes.
+    Act: Match URLs with each approach, then time a few lookups.
+    Assert: Both approaches agree, and both are timed.
+    """
+    index = DomainIndex(TRACKING_PREFIXES)
+    urls = URLS + (
+        "https://podtrac.com/1",
+        "https://notop3.dev/1.mp3",
+        "https://www.buzzsprout.com/1/2.mp3"
+    )
+
+    assert [index_match(url, index) for url in urls] == [
+        linear_match(url) for url in urls
+    ], "Index and linear scan disagree."
+
+    results = benchmark_domains(number=10, repeat=1)
+    assert sorted(results.keys()) == ["index", "linear"], "Approach missing."
+    assert all(value > 0 for value in results.values()), "Lookup not timed."
@@ -0,0 +1,80 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_cache
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's persistent cache.
+"""
+
+from ghostexporter.cache import Cache, MISSING
+from unittest.mock import patch
+
+
+def test_expiry(tmp_path):
+    """
+    Read a value after it has expired.
+
+    Arrange: Cache a value and a negative (`None`) value with TTLs.
+    Act: Read the values before and after they expire.
+    Assert: Expired values are treated as missing.
+    """
+    cache = Cache(str(tmp_path / "cache.sqlite3"))
+
+    with patch("time.time", lambda: 1000):
+        cache.set("a", "https://example.com/", ttl=10)
+        cache.set("b", None, ttl=5)
+
+        assert cache.get("a") == "https://example.com/", "Value not cached."
+        assert cache.get("b", MISSING) is None, "Negative value not cached."
+
+    with patch("time.time", lambda: 1006):
+        assert cache.get("b", MISSING) is MISSING, "Value did not expire."
+        assert cache.get("a") == "https://example.com/", "Value expired."
+
+
+def test_lru_eviction(tmp_path):
+    """
+    Add more values than the cache can hold.
+
+    Arrange: Create a cache with a limit of two entries.
+    Act: Add three values, reading the first before adding the third.
+    Assert: The least recently used value is evicted.
+    """
+    cache = Cache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+
+    for now, key in ((1, "a"), (2, "b")):
+        with patch("time.time", lambda: now):
+            cache.set(key, key)
+
+    with patch("time.time", lambda: 3):
+        cache.get("a")
+
+    with patch("time.time", lambda: 4):
+        cache.set("c", "c")
+
+    assert len(cache) == 2, "Cache not capped."
+    assert cache.get("b", MISSING) is MISSING, "Wrong value evicted."
+    assert cache.get("a") == "a", "Recently used value evicted."
+
+
+def test_batch_eviction(tmp_path):
+    """
+    Fill a cache past its limit, a value at a time.
+
+    Arrange: Create a cache with a limit of 100 entries.
+    Act: Add values one at a time, counting evictions.
+    Assert: Keys are only counted when the limit is passed, and evicted in
+    batches, oldest first.
+    """
+    cache = Cache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+
+    with patch.object(Cache, "evict", autospec=True, side_effect=Cache.evict) as evict:  # noqa
+        for index in range(110):
+            with patch("time.time", lambda: index):
+                cache.set("key%d" % index, index)
+
+    assert evict.call_count == 2, "Eviction not batched."
+    assert len(cache) == 98, "Cache not capped."
+    assert cache.get("key11", MISSING) is MISSING, "Wrong value kept."
+    assert cache.get("key12") == 12, "Wrong value evicted."
@@ -9,9 +9,40 @@ module.
 """
 
 from click.testing import CliRunner, Result
-from .utils import mock_http
+from ghostexporter import settings
+from unittest.mock import patch
+from .utils import FEED, FakeResponse, mock_http
 import ghostexporter.cli as cli
+import gzip
+import importlib.util
 import json
+import pytest
+import subprocess
+import sys
+
+
+HELP_IMPORT_BUDGET = 0.15  #: seconds allowed for importing the CLI
+
+HEAVY_MODULES = (
+    "bleach",
+    "bs4",
+    "dateutil",
+    "feedparser",
+    "requests",
+    "slugify"
+)  #: third-party modules that should only be imported when needed
+
+HELP_SCRIPT = """
+import sys
+from ghostexporter.cli import cli
+
+try:
+    cli(["--help"])
+except SystemExit:
+    pass
+
+print(" ".join(sys.modules))
+"""
 
 
 def test_no_url():
@@ -28,6 +59,161 @@ def test_no_url():
     ), "URL argument must be enforced."
 
 
+def test_missing_json_backend():
+    """
+    Run CLI command with a JSON backend that isn't installed.
+
+    Arrange: Hide the orjson package.
+    Act: Run the CLI subcommand with the orjson backend.
+    Assert: The output produces a usage error.
+    """
+    find_spec = importlib.util.find_spec
+
+    with patch(
+        "importlib.util.find_spec",
+        lambda name: None if name == "orjson" else find_spec(name)
+    ):
+        result: Result = CliRunner().invoke(
+            cli.cli,
+            ["https://example.com/feed.xml", "--json-backend", "orjson"]
+        )
+
+    assert result.exit_code == 2, "Missing backend not rejected."
+    assert "requires the orjson package" in result.output, "Wrong error."
+
+
+@pytest.mark.parametrize(
+    "args,valid",
+    [
+        (["--compress", "gzip", "--compress-level", "9"], True),
+        (["--compress", "gzip", "--compress-level", "42"], False),
+        (["--output", "out.json.gz", "--compress-level", "0"], False),
+        (["--output", "out.json.zst", "--compress-level", "22"], True),
+        (["--compress", "zstd", "--compress-level", "23"], False),
+        (["--compress-level", "5"], False),
+        (["--output", "out.json", "--compress-level", "5"], False)
+    ]
+)
+def test_compress_level(args, valid):
+    """
+    Run CLI command with a compression level.
+
+    Arrange: Pretend every compression package is installed, and stop the
+    export before it starts.
+    Act: Run the CLI subcommand with a compression format and level.
+    Assert: Levels out of range for the format produce a usage error.
+    """
+    with patch("ghostexporter.compression.is_available", lambda name: True):
+        with patch("ghostexporter.models.Feed", side_effect=SystemExit(0)):
+            result: Result = CliRunner().invoke(
+                cli.cli,
+                ["https://example.com/feed.xml"] + args
+            )
+
+    assert (result.exit_code != 2) is valid, "Incorrect level check."
+
+    if not valid:
+        assert "Error: --compress-level" in result.output, "Wrong error."
+
+
+@pytest.mark.parametrize(
+    "feed,args,message",
+    [
+        (FEED, ["--max-feed-size", "100"], "larger than the maximum"),
+        (FEED[:-40], [], "not valid XML")
+    ],
+    ids=["too-large", "malformed"]
+)
+def test_feed_errors(tmp_path, feed, args, message):
+    """
+    Run CLI command with a streamed feed that can't be read in full.
+
+    Arrange: Mock a GET request, without a Content-Length header.
+    Act: Run the CLI subcommand, streaming the feed to an output file.
+    Assert: The output produces an error, and no output file.
+    """
+    path = str(tmp_path / "export.json")
+
+    with patch(
+        "requests.get",
+        lambda url, **kwargs: FakeResponse(200, {}, feed)
+    ):
+        result: Result = CliRunner().invoke(
+            cli.cli,
+            ["https://example.com/feed.xml", "--stream", "-o", path] + args
+        )
+
+    assert result.exit_code == 1, "Error not reported."
+    assert message in result.output, "Wrong error."
+    assert not tmp_path.exists() or not list(tmp_path.iterdir()), (
+        "Output written."
+    )
+
+
+def test_skip_unchanged(tmp_path):
+    """
+    Run CLI command twice against a feed that hasn't changed.
+
+    Arrange: Mock GET requests that honour ETags, and a cache directory.
+    Act: Export the feed twice, then twice more skipping unchanged feeds.
+    Assert: The feed is only skipped when asked.
+    """
+
+    def get(url, headers={}, **kwargs):
+        if headers.get("If-None-Match") == "abc":
+            return FakeResponse(304)
+
+        return FakeResponse(200, {"ETag": "abc"}, FEED)
+
+    args = ["https://example.com/feed.xml", "--cache-dir", str(tmp_path)]
+    outputs = []
+
+    with patch("requests.get", get):
+        for extra in ([], [], ["--skip-unchanged"], ["--skip-unchanged"]):
+            result: Result = CliRunner().invoke(cli.cli, args + extra)
+
+            if result.exception:
+                raise result.exception
+
+            outputs.append(result.stdout)
+
+    assert all(outputs[:3]), "Feed skipped without --skip-unchanged."
+    assert outputs[3] == "", "Unchanged feed not skipped."
+
+
+def test_help_imports():
+    """
+    Show the CLI help text in a fresh interpreter.
+
+    Arrange/Act: Run the CLI with --help, timing imports.
+    Assert: No heavy dependencies are imported, and importing the CLI
+    stays within budget.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", HELP_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    modules = set(result.stdout.splitlines()[-1].split())
+    for name in HEAVY_MODULES:
+        assert name not in modules, "%s imported for --help." % name
+
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+
+        if len(parts) == 3 and parts[2] == "ghostexporter.cli":
+            seconds = int(parts[1]) / 1000000
+            break
+    else:
+        assert False, "CLI import not timed."  # pragma: no cover
+
+    assert (
+        seconds < HELP_IMPORT_BUDGET
+    ), "Importing the CLI took %.3fs." % seconds
+
+
 @mock_http("cli", "test_transistor")
 def test_transistor():
     """
@@ -54,7 +240,7 @@ def test_transistor():
     ), "Incorrect verison number."
 
     assert (
-        db["data"]["posts"][0]["id"] == "1e42894556c3ab3218d475253b1e9845"
+        db["data"]["posts"][0]["id"] == "b38261443c488a6a3ed9bb7a376f34b4"
     ), "Incorrect item ID."
 
 
@@ -84,5 +270,123 @@ def test_buzzsprout():
     ), "Incorrect verison number."
 
     assert (
-        db["data"]["posts"][0]["id"] == "abe64cf9e68177cedc1add251dd46b6f"
+        db["data"]["posts"][0]["id"] == "70be3886f205d6928f0b6bda01e1f781"
     ), "Incorrect item ID."
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_buzzsprout_jobs():
+    """
+    Run CLI command with items built across multiple processes.
+
+    Arrange/Act: Run the CLI subcommand with and without the jobs option.
+    Assert: Both documents contain the same posts, in the same order.
+    """
+    runner: CliRunner = CliRunner()
+    docs = []
+
+    for args in ([], ["--jobs", "2"]):
+        result: Result = runner.invoke(
+            cli.cli,
+            ["https://feeds.buzzsprout.com/156239.rss", *args]
+        )
+
+        try:
+            doc = json.loads(result.output.strip())
+        except Exception:
+            raise result.exception
+
+        docs.append(
+            [
+                (post["id"], post["slug"], post["html"])
+                for post in doc["db"][0]["data"]["posts"]
+            ]
+        )
+
+    assert docs[0] == docs[1], "Posts differ when using multiple jobs."
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_buzzsprout_shards(tmp_path):
+    """
+    Run CLI command, splitting posts across several documents.
+
+    Arrange/Act: Run the CLI subcommand with an output directory.
+    Assert: Each document holds at most the given number of posts.
+    """
+    runner: CliRunner = CliRunner()
+    result: Result = runner.invoke(
+        cli.cli,
+        [
+            "https://feeds.buzzsprout.com/156239.rss",
+            "--output-dir", str(tmp_path),
+            "--shard-size", "3"
+        ]
+    )
+
+    if result.exception:
+        raise result.exception
+
+    posts = []
+    for path in sorted(tmp_path.iterdir()):
+        with open(path, "r") as f:
+            doc = json.load(f)
+
+        posts.append(len(doc["db"][0]["data"]["posts"]))
+
+    assert posts == [3, 3, 3, 1], "Posts not split."
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_buzzsprout_gzip():
+    """
+    Run CLI command, compressing the document written to stdout.
+
+    Arrange/Act: Run the CLI subcommand with gzip compression.
+    Assert: The output decompresses to a valid Ghost JSON document.
+    """
+    runner: CliRunner = CliRunner()
+    result: Result = runner.invoke(
+        cli.cli,
+        ["https://feeds.buzzsprout.com/156239.rss", "--compress", "gzip"]
+    )
+
+    if result.exception:
+        raise result.exception
+
+    doc = json.loads(gzip.decompress(result.stdout_bytes))
+    assert len(doc["db"][0]["data"]["posts"]) == 10, "Incorrect output."
+
+
+@mock_http("cli", "test_buzzsprout")
+def test_buzzsprout_processes(monkeypatch):
+    """
+    Run CLI command with feeds exported across worker processes.
+
+    Arrange: Fork workers, so they inherit the mocked requests.
+    Act: Run the CLI subcommand with and without the processes option.
+    Assert: Both documents contain the same posts, in the same order.
+    """
+    monkeypatch.setattr(settings, "BATCH_START_METHOD", "fork")
+    runner: CliRunner = CliRunner()
+    docs = []
+
+    for args in ([], ["--processes", "2"]):
+        result: Result = runner.invoke(
+            cli.cli,
+            ["https://feeds.buzzsprout.com/156239.rss", *args]
+        )
+
+        try:
+            doc = json.loads(result.stdout.strip())
+        except Exception:
+            raise result.exception
+
+        docs.append(
+            [
+                (post["id"], post["slug"], post["html"])
+                for post in doc["db"][0]["data"]["posts"]
+            ]
+        )
+
+    assert docs[0] == docs[1], "Posts differ when using worker processes."
@@ -0,0 +1,108 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_compression
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's compressed output module.
+"""
+
+from ghostexporter.compression import get_compression, open_output
+import gzip
+import io
+import os
+import pytest
+
+
+@pytest.mark.parametrize(
+    "path,compression,expected",
+    [
+        ("export.json", "auto", None),
+        ("export.json.gz", "auto", "gzip"),
+        ("export.json.zst", "auto", "zstd"),
+        ("export.json.gz", "none", None),
+        (None, "gzip", "gzip"),
+        (None, "auto", None)
+    ]
+)
+def test_get_compression(path, compression, expected):
+    """
+    Choose a compression format.
+
+    Arrange/Act: Get the compression format for a filename and option.
+    Assert: The correct format is chosen.
+    """
+    assert (
+        get_compression(path, compression) == expected
+    ), "Incorrect compression format."
+
+
+def test_gzip_output(tmp_path):
+    """
+    Write a gzipped document in chunks.
+
+    Arrange: Open a file with a .gz extension for output.
+    Act: Write a large document a chunk at a time.
+    Assert: Compressed data is written before the document is finished,
+    and decompresses to the whole document.
+    """
+    path = str(tmp_path / "export.json.gz")
+    chunks = ['{"n": %d, "text": "%s"}, ' % (i, os.urandom(32).hex()) for i in range(50000)]  # noqa
+
+    with open_output(path) as stream:
+        for chunk in chunks:
+            stream.write(chunk)
+
+        temp = [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+        assert os.path.getsize(tmp_path / temp[0]) > 0, "Output not streamed."
+        assert not os.path.exists(path), "Output replaced before finishing."
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert f.read() == "".join(chunks), "Incorrect output."
+
+
+def test_zstd_output(tmp_path):
+    """
+    Write a zstd-compressed document.
+
+    Arrange: Open a file with a .zst extension for output.
+    Act: Write a document.
+    Assert: The file decompresses to the document.
+    """
+    zstandard = pytest.importorskip("zstandard")
+    path = str(tmp_path / "export.json.zst")
+
+    with open_output(path, level=1) as stream:
+        stream.write('{"db": []}')
+
+    with open(path, "rb") as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        text = io.TextIOWrapper(reader, encoding="utf-8").read()
+
+    assert text == '{"db": []}', "Incorrect output."
+
+
+@pytest.mark.parametrize("filename", ["export.json", "export.json.gz"])
+def test_failed_output(tmp_path, filename):
+    """
+    Fail part way through writing a document.
+
+    Arrange: Write a complete document to a file.
+    Act: Write part of another document to the same file, then fail.
+    Assert: The complete document is kept, with no temporary file left.
+    """
+    path = str(tmp_path / filename)
+
+    with open_output(path) as stream:
+        stream.write('{"db": []}')
+
+    with pytest.raises(RuntimeError):
+        with open_output(path) as stream:
+            stream.write('{"db": [')
+            raise RuntimeError("Export failed.")
+
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        assert f.read() == '{"db": []}', "Complete document replaced."
+
+    assert os.listdir(tmp_path) == [filename], "Temporary file left."
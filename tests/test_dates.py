@@ -0,0 +1,95 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_dates
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's date parsing module.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from ghostexporter.dates import TIMEZONES, parse_date
+import pytest
+import time
+
+
+@pytest.mark.parametrize(
+    "value,parsed,expected",
+    [
+        (
+            "Mon, 01 Jan 2024 09:00:00 +0000",
+            None,
+            "2024-01-01T09:00:00+00:00"
+        ),
+        (
+            "Mon, 1 Jan 24 09:00 -0530",
+            None,
+            "2024-01-01T09:00:00-05:30"
+        ),
+        (
+            "1 January 2024 09:00:00 EST",
+            None,
+            "2024-01-01T09:00:00-05:00"
+        ),
+        (
+            "2024-01-01T09:00:00.1234567Z",
+            None,
+            "2024-01-01T09:00:00.123456+00:00"
+        ),
+        (
+            "2024-01-01T09:00:00+01:00",
+            None,
+            "2024-01-01T09:00:00+01:00"
+        ),
+        (
+            "Monday 1st January 2024, 9am",
+            time.strptime("2024-01-01 09:00", "%Y-%m-%d %H:%M"),
+            "2024-01-01T09:00:00+00:00"
+        ),
+        (
+            "January 1, 2024 9:00 AM",
+            None,
+            "2024-01-01T09:00:00+00:00"
+        ),
+        ("not a date", None, None),
+        (None, None, None)
+    ]
+)
+def test_parse_date(value, parsed, expected):
+    """
+    Parse dates in the formats found in feeds.
+
+    Arrange/Act: Parse a date string, with feedparser's parsed date.
+    Assert: The date and its offset are correct.
+    """
+    date = parse_date(value, parsed)
+
+    if expected is None:
+        assert date is None, "Invalid date parsed."
+    else:
+        assert date.isoformat() == expected, "Incorrect date."
+
+
+def test_parse_date_threads():
+    """
+    Parse dates with numeric offsets from several threads.
+
+    Arrange: Build dates with a range of offsets, and copy the named zones.
+    Act: Parse the dates across a pool of threads.
+    Assert: Every offset is correct, and the named zones are unchanged.
+    """
+    zones = dict(TIMEZONES)
+    values = [
+        "Mon, 01 Jan 2024 09:00:00 %s%02d%02d" % (sign, hours, minutes)
+        for sign in "+-"
+        for hours in range(1, 12)
+        for minutes in (0, 30)
+    ]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        dates = list(executor.map(parse_date, values * 10))
+
+    assert [
+        date.strftime("%z") for date in dates
+    ] == [value[-5:] for value in values * 10], "Incorrect offset."
+    assert TIMEZONES == zones, "Named zones modified."
@@ -0,0 +1,146 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_hooks
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's event hooks.
+"""
+
+from ghostexporter import hooks
+from ghostexporter.transformers.v5 import Ghost5Transformer
+from .utils import make_items
+import asyncio
+import io
+import json
+
+
+def test_on_off():
+    """
+    Register and unregister a listener.
+
+    Arrange: Register the same listener twice, alongside another.
+    Act: Emit an event, unregister the first listener, then emit again.
+    Assert: Only the remaining listener runs after the first is removed.
+    """
+    calls = []
+
+    def first(value):
+        calls.append(("first", value))
+
+    def second(value):
+        calls.append(("second", value))
+
+    hooks.on("test_on_off")(first)
+    hooks.on("test_on_off")(second)
+    hooks.on("test_on_off")(first)
+
+    hooks.emit("test_on_off", value=1)
+    hooks.off("test_on_off", first)
+    hooks.emit("test_on_off", value=2)
+    hooks.off("test_on_off", second)
+    hooks.emit("test_on_off", value=3)
+
+    assert calls == [
+        ("first", 1),
+        ("second", 1),
+        ("first", 1),
+        ("second", 2)
+    ], "Listeners not run in order."
+
+    assert not hooks.listening("test_on_off"), "Listeners not removed."
+
+
+def test_emit_without_listeners():
+    """
+    Emit an event nothing is listening for.
+
+    Arrange: Make sure nothing is listening for an event.
+    Act: Emit the event.
+    Assert: No listeners are registered as a side effect.
+    """
+    hooks.emit("test_nothing", value=1)
+    assert not hooks.listening("test_nothing"), "Listener list created."
+
+
+def test_async_listener():
+    """
+    Emit an event to an async listener, with and without an event loop.
+
+    Arrange: Register an async listener that awaits.
+    Act: Emit the event outside a loop, inside one, and awaited.
+    Assert: The listener runs to completion each time, once waited for.
+    """
+    calls = []
+
+    @hooks.on("test_async")
+    async def listener(value):
+        await asyncio.sleep(0.01)
+        calls.append(value)
+
+    async def main():
+        hooks.emit("test_async", value=2)
+        await hooks.drain()
+        await hooks.emit_async("test_async", value=3)
+
+    try:
+        hooks.emit("test_async", value=1)
+        hooks.join()
+        asyncio.run(main())
+    finally:
+        hooks.off("test_async", listener)
+
+    assert calls == [1, 2, 3], "Async listener not run."
+
+
+def test_async_listener_loop():
+    """
+    Emit events to an async listener outside an event loop.
+
+    Arrange: Register an async listener that records its event loop.
+    Act: Emit the event twice, and wait for the listener.
+    Assert: Both calls run on the same, persistent loop.
+    """
+    loops = []
+
+    @hooks.on("test_async_loop")
+    async def listener():
+        loops.append(asyncio.get_running_loop())
+
+    try:
+        hooks.emit("test_async_loop")
+        hooks.emit("test_async_loop")
+        hooks.join()
+    finally:
+        hooks.off("test_async_loop", listener)
+
+    assert len(loops) == 2 and loops[0] is loops[1], "Loop not reused."
+    assert loops[0].is_running(), "Loop not kept running."
+
+
+def test_item_transformed():
+    """
+    Add a collection to a document when each item is transformed.
+
+    Arrange: Register a listener that tags each post.
+    Act: Write a document.
+    Assert: The document contains the listener's collection.
+    """
+
+    @hooks.on("item_transformed")
+    def tag(item, doc):
+        doc["posts_tags"] = [{"post_id": item.id, "tag_id": "1"}]
+
+    items = make_items(2)
+    stream = io.StringIO()
+
+    try:
+        Ghost5Transformer(lambda: items).write(stream)
+    finally:
+        hooks.off("item_transformed", tag)
+
+    data = json.loads(stream.getvalue())["db"][0]["data"]
+    assert data["posts_tags"] == [
+        {"post_id": item.id, "tag_id": "1"}
+        for item in items
+    ], "Collection not added."
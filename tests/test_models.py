@@ -0,0 +1,333 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_models
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's models.
+"""
+
+from datetime import datetime, timezone
+from ghostexporter import hooks
+from ghostexporter.cache import Cache
+from ghostexporter.models import (
+    FeedNotModified,
+    FeedTooLarge,
+    Item,
+    ItemList,
+    MergedItemList
+)
+
+from io import StringIO
+from tempfile import SpooledTemporaryFile
+from unittest.mock import patch
+from .utils import FEED, FakeResponse
+import json
+import pytest
+
+
+def fake_get(requests, validators):
+    """Return a GET request stand-in that honours conditional requests."""
+
+    def get(url, headers={}, **kwargs):
+        requests.append(headers)
+
+        if validators and headers.get("If-None-Match") == "abc":
+            return FakeResponse(304)
+
+        return FakeResponse(
+            200,
+            {"ETag": "abc"} if validators else {},
+            FEED
+        )
+
+    return get
+
+
+@pytest.mark.parametrize("validators", [True, False])
+def test_unchanged_feed(tmp_path, validators):
+    """
+    Fetch a feed that hasn't changed since it was last exported.
+
+    Arrange: Mock GET requests, with or without ETag support.
+    Act: Fetch the feed, save its state, then fetch it again.
+    Assert: The second fetch is skipped before the feed is parsed.
+    """
+    cache = Cache(str(tmp_path / "feeds.sqlite3"), name="feeds")
+    requests = []
+
+    with patch("requests.get", fake_get(requests, validators)):
+        items = ItemList("https://example.com/feed.xml", cache=cache)
+        assert len(items.all()) == 1, "Incorrect number of items."
+        items.save_state()
+
+        with patch("ghostexporter.models.parse_feed") as parse_feed:
+            with pytest.raises(FeedNotModified):
+                ItemList("https://example.com/feed.xml", cache=cache).all()
+
+            parse_feed.assert_not_called()
+
+        items = ItemList(
+            "https://example.com/feed.xml",
+            cache=cache,
+            force=True
+        )
+
+        assert len(items.all()) == 1, "Forced export skipped."
+
+    assert (
+        ("If-None-Match" in requests[1]) is validators
+    ), "Conditional request not sent."
+
+
+def test_since_state(tmp_path):
+    """
+    Export only new episodes.
+
+    Arrange: Mock GET requests and create an episode state cache.
+    Act: Export the feed, add an episode, then export it again.
+    Assert: Only the new episode is built the second time.
+    """
+    episodes = Cache(str(tmp_path / "episodes.sqlite3"), name="episodes")
+    requests = []
+
+    with patch("requests.get", fake_get(requests, False)):
+        items = ItemList("https://example.com/feed.xml", episodes=episodes)
+        assert len(items.all()) == 1, "Incorrect number of items."
+        items.save_state()
+
+    feed = FEED.replace(
+        b"  </channel>",
+        b"""    <item>
+      <title>Episode 2</title>
+      <pubDate>Mon, 08 Jan 2024 09:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/2.mp3" type="audio/mpeg" />
+    </item>
+  </channel>"""
+    )
+
+    with patch(
+        "requests.get",
+        lambda url, **kwargs: FakeResponse(200, {}, feed)
+    ):
+        with patch("ghostexporter.models.Item", wraps=Item) as item_cls:
+            items = ItemList(
+                "https://example.com/feed.xml",
+                episodes=episodes
+            ).all()
+
+    assert [item.title for item in items] == ["Episode 2"], "Wrong items."
+    assert item_cls.call_count == 1, "Exported entry was rebuilt."
+
+
+def test_since_state_shared(tmp_path):
+    """
+    Export two feeds whose episodes have the same GUID.
+
+    Arrange: Mock GET requests for two feeds, sharing an episode cache.
+    Act: Export the first feed, then the second.
+    Assert: The second feed's episode isn't mistaken for the first's.
+    """
+    episodes = Cache(str(tmp_path / "episodes.sqlite3"), name="episodes")
+    feed = FEED.replace(
+        b"<title>Episode 1</title>",
+        b"<title>Episode 1</title>\n      <guid>1</guid>"
+    )
+
+    with patch(
+        "requests.get",
+        lambda url, **kwargs: FakeResponse(200, {}, feed)
+    ):
+        for url in ("https://example.com/a.xml", "https://example.com/b.xml"):
+            items = ItemList(url, episodes=episodes)
+            assert len(items.all()) == 1, "Episode skipped."
+            items.save_state()
+
+        items = ItemList("https://example.com/a.xml", episodes=episodes)
+        assert items.all() == [], "Exported episode not skipped."
+
+
+def test_merged_feeds():
+    """
+    Combine items from several feeds.
+
+    Arrange: Mock GET requests for two feeds with interleaved episodes.
+    Act: Merge the item lists of both feeds.
+    Assert: Items from both feeds are returned in publish order.
+    """
+    feeds = {
+        "https://example.com/a.xml": FEED.replace(
+            b"  </channel>",
+            b"""    <item>
+      <title>Episode 3</title>
+      <pubDate>Mon, 15 Jan 2024 09:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/3.mp3" type="audio/mpeg" />
+    </item>
+  </channel>"""
+        ),
+        "https://example.com/b.xml": FEED.replace(
+            b"Episode 1", b"Episode 2"
+        ).replace(
+            b"01 Jan 2024", b"08 Jan 2024"
+        )
+    }
+
+    def get(url, **kwargs):
+        return FakeResponse(200, {}, feeds[url])
+
+    with patch("requests.get", get):
+        items = MergedItemList(
+            [ItemList(url) for url in feeds.keys()]
+        ).all()
+
+        titles = [item.title for item in items]
+
+    assert (
+        titles == ["Episode 1", "Episode 2", "Episode 3"]
+    ), "Items not merged in publish order."
+    assert titles == [item.title for item in items], "Merge not repeatable."
+
+
+def test_streamed_feed():
+    """
+    Read a feed with the incremental parser.
+
+    Arrange: Mock GET requests for a small feed.
+    Act: Read the feed with and without streaming, then with a size limit.
+    Assert: Both parsers produce the same items, and the limit is enforced.
+    """
+    requests = []
+
+    with patch("requests.get", fake_get(requests, False)):
+        for stream in (False, True):
+            items = ItemList("https://example.com/feed.xml", stream=stream)
+            assert (
+                [
+                    (item.title, item.published, item.enclosure)
+                    for item in items.all()
+                ] == [
+                    (
+                        "Episode 1",
+                        datetime(2024, 1, 1, 9, tzinfo=timezone.utc),
+                        "https://example.com/1.mp3"
+                    )
+                ]
+            ), "Incorrect items."
+
+        with pytest.raises(FeedTooLarge):
+            ItemList(
+                "https://example.com/feed.xml",
+                stream=True,
+                max_size=100
+            ).all()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_missing_publish_date(stream):
+    """
+    Export a feed with an entry that has no publish date.
+
+    Arrange: Mock a GET request for a feed with an undated entry.
+    Act: Get the items in the feed.
+    Assert: The undated entry is skipped, and the other keeps its offset.
+    """
+    feed = FEED.replace(b"+0000", b"-0500").replace(
+        b"  </channel>",
+        b"""    <item>
+      <title>Episode 2</title>
+      <enclosure url="https://example.com/2.mp3" type="audio/mpeg" />
+    </item>
+  </channel>"""
+    )
+
+    with patch(
+        "requests.get",
+        lambda url, **kwargs: FakeResponse(200, {}, feed)
+    ):
+        items = ItemList("https://example.com/feed.xml", stream=stream).all()
+
+    assert [item.title for item in items] == ["Episode 1"], "Wrong items."
+    assert (
+        items[0].published.isoformat() == "2024-01-01T09:00:00-05:00"
+    ), "Timezone not preserved."
+
+
+class ChunkedResponse(FakeResponse):
+    """A response whose body arrives in small chunks."""
+
+    def iter_content(self, chunk_size):
+        """Yield the body 16 bytes at a time."""
+        for start in range(0, len(self.content), 16):
+            yield self.content[start:start + 16]
+
+
+def test_streamed_document():
+    """
+    Write a document for a streamed feed.
+
+    Arrange: Mock a GET request for a feed with HTML in its summary,
+    delivered in small chunks, and forbid spooling the body.
+    Act: Write the document.
+    Assert: Items are parsed from the response as it downloads, and the
+    summary is sanitised.
+    """
+    feed = FEED.replace(
+        b"</pubDate>",
+        b"</pubDate>\n      <description><![CDATA[<p>Hi<script>x</script>"
+        b"</p>]]></description>"
+    )
+
+    def get(url, **kwargs):
+        return ChunkedResponse(200, {}, feed)
+
+    parsed = []
+    stream = StringIO()
+
+    @hooks.on("item_parsed")
+    def collect(item, feed):
+        parsed.append(item)
+
+    try:
+        with patch("requests.get", get):
+            with patch("ghostexporter.models.SpooledTemporaryFile") as spool:
+                items = ItemList("https://example.com/feed.xml", stream=True)
+                items.check()
+                items.to("5").write(stream)
+    finally:
+        hooks.off("item_parsed", collect)
+
+    assert not spool.called, "Feed body spooled."
+    posts = json.loads(stream.getvalue())["db"][0]["data"]["posts"]
+    assert [post["title"] for post in posts] == ["Episode 1"], "Wrong posts."
+    assert "<script>" not in parsed[0].summary, "Summary not sanitised."
+
+
+def test_spool_closed():
+    """
+    Fail to download a feed part way through.
+
+    Arrange: Mock a GET request whose body fails to download.
+    Act: Fetch the feed.
+    Assert: The spooled body is closed.
+    """
+
+    class BrokenResponse(FakeResponse):
+        """A response whose body fails part way through."""
+
+        def iter_content(self, chunk_size):
+            """Yield the start of the body, then fail."""
+            yield b"<rss>"
+            raise ConnectionError("Connection reset.")
+
+    spools = []
+
+    def spool(*args):
+        spools.append(SpooledTemporaryFile(*args))
+        return spools[-1]
+
+    with patch("requests.get", lambda url, **kwargs: BrokenResponse(200)):
+        with patch("ghostexporter.models.SpooledTemporaryFile", spool):
+            with pytest.raises(ConnectionError):
+                ItemList("https://example.com/feed.xml").fetch()
+
+    assert spools and spools[0].closed, "Spool not closed."
@@ -0,0 +1,309 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_playback
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's podcast player library.
+"""
+
+from collections import Counter
+from ghostexporter import playback, settings
+from ghostexporter.cache import Cache
+from ghostexporter.playback import plugins
+from ghostexporter.playback.library import EmbedBase, Library
+from unittest.mock import patch
+from .utils import FakeResponse
+import pytest
+import sys
+import time
+
+
+def fake_head(calls):
+    """Return a HEAD request stand-in that redirects via tracking prefixes."""
+
+    def head(url, **kwargs):
+        calls[url] += 1
+        time.sleep(0.01)
+
+        if url.startswith("https://op3.dev/e/"):
+            return FakeResponse(302, {"Location": "https://" + url[18:]})
+
+        if url.startswith("https://pdcn.co/e/"):
+            return FakeResponse(302, {"Location": "https://" + url[18:]})
+
+        return FakeResponse(200)
+
+    return head
+
+
+def test_resolve_shares_lookups():
+    """
+    Resolve a batch of enclosures sharing tracking prefixes.
+
+    Arrange: Mock HEAD requests and create a batch with duplicate URLs.
+    Act: Resolve the batch, then strip tracking from each URL.
+    Assert: Every redirect hop is only requested once.
+    """
+    calls = Counter()
+    library = Library()
+    urls = [
+        "https://op3.dev/e/pdcn.co/e/example.com/%d.mp3" % (index % 3)
+        for index in range(12)
+    ]
+
+    with patch("requests.head", fake_head(calls)):
+        library.resolve(urls, workers=4)
+
+    assert all(count == 1 for count in calls.values()), "Hops repeated."
+    assert len(calls) == 6, "Incorrect number of hops."
+
+    with patch("requests.head", fake_head(calls)):
+        assert (
+            library.strip_tracking(urls[0]) == "https://example.com/0.mp3"
+        ), "Incorrect final URL."
+
+    assert len(calls) == 6 and sum(calls.values()) == 6, "URL re-requested."
+
+
+def test_cached_hops(tmp_path):
+    """
+    Resolve the same batch twice with a persistent cache.
+
+    Arrange: Mock HEAD requests and open a cache in a temporary directory.
+    Act: Resolve a batch with one library, then again with a new one.
+    Assert: The second library makes no requests, including for URLs that
+    didn't redirect.
+    """
+    calls = Counter()
+    urls = [
+        "https://op3.dev/e/pdcn.co/e/example.com/1.mp3",
+        "https://op3.dev/e/example.com/2.mp3",
+        "https://chtbl.com/track/example.com/3.mp3"
+    ]
+
+    for attempt in range(2):
+        library = Library()
+        library.cache = Cache(
+            str(tmp_path / "redirects.sqlite3"),
+            name="redirects"
+        )
+
+        with patch("requests.head", fake_head(calls)):
+            library.resolve(urls)
+            assert (
+                library.strip_tracking(urls[0]) == "https://example.com/1.mp3"
+            ), "Incorrect final URL."
+
+        library.cache.close()
+
+    assert sum(calls.values()) == 4, "Cached hops were re-requested."
+
+
+def test_failed_hops_retried():
+    """
+    Resolve a tracking URL after its first lookup fails.
+
+    Arrange: Mock HEAD requests, failing the first one.
+    Act: Strip tracking from a URL twice.
+    Assert: The failure isn't remembered, so the second lookup succeeds.
+    """
+    calls = Counter()
+    head = fake_head(calls)
+    url = "https://op3.dev/e/example.com/1.mp3"
+
+    def flaky_head(url, **kwargs):
+        if not calls:
+            calls["failed"] += 1
+            raise ConnectionError("Connection reset.")
+
+        return head(url, **kwargs)
+
+    library = Library()
+    with patch("requests.head", flaky_head):
+        try:
+            library.strip_tracking(url)
+        except ConnectionError:
+            pass
+
+        assert (
+            library.strip_tracking(url) == "https://example.com/1.mp3"
+        ), "Failed lookup remembered."
+
+
+def test_tracking_prefixes():
+    """
+    Match URLs against the tracking prefix index.
+
+    Arrange: Create a library and add an extra tracking prefix.
+    Act: Check a mix of tracking and non-tracking URLs.
+    Assert: Exact, "www." and wildcard domains are matched, ignoring ports
+    and credentials.
+    """
+    library = Library()
+    library.add_tracking_prefixes(["*.example.org"])
+
+    for url, expected in (
+        ("https://op3.dev/e/example.com/1.mp3", True),
+        ("https://www.chtbl.com/track/1", True),
+        ("https://dts.podtrac.com/redirect.mp3/1", True),
+        ("https://podtrac.com/1", True),
+        ("https://stats.example.org/1.mp3", True),
+        ("https://op3.dev:443/e/example.com/1.mp3", True),
+        ("https://user@chtbl.com/track/1", True),
+        ("https://notop3.dev/1.mp3", False),
+        ("https://www.buzzsprout.com/1/2.mp3", False),
+        ("https://media.transistor.fm/a/b.mp3", False)
+    ):
+        assert (
+            library.is_tracking_url(url) is expected
+        ), "Incorrect match for %s." % url
+
+
+def test_player_registry():
+    """
+    Find players for enclosure URLs.
+
+    Arrange: Register an exact-domain and a wildcard-domain player.
+    Act: Render embeds for URLs on each domain.
+    Assert: Each URL is handled by the matching player, using the instance
+    created when it was registered.
+    """
+
+    class ExactEmbed(EmbedBase):
+        domains = ("media.example.com",)
+        instances = 0
+
+        def __init__(self):
+            ExactEmbed.instances += 1
+
+        def get_embed_url(self, url):
+            return "https://exact.example.com/"
+
+    class WildcardEmbed(EmbedBase):
+        domains = ("*.example.com",)
+
+        def get_embed_url(self, url):
+            return "https://wildcard.example.com/"
+
+    library = Library()
+    library.register(WildcardEmbed)
+    library.register(ExactEmbed)
+
+    for url, expected in (
+        ("https://media.example.com/1.mp3", "exact"),
+        ("https://cdn.example.com/1.mp3", "wildcard"),
+        ("https://example.com/1.mp3", "wildcard")
+    ):
+        assert (
+            "https://%s.example.com/" % expected in library.get_html(url)
+        ), "Incorrect player for %s." % url
+
+    assert library.get_html("https://example.org/1.mp3") is None
+    assert ExactEmbed.instances == 1, "Player instantiated more than once."
+
+
+@pytest.fixture
+def embeds(monkeypatch):
+    """Swap the global player library for an empty one, for one test."""
+    library = Library()
+    monkeypatch.setattr(playback, "embeds", library)
+    return library
+
+
+PLUGIN_MODULE = """
+from ghostexporter import playback
+
+
+@playback.register()
+class LazyEmbed(playback.EmbedBase):
+    domains = ("media.lazy.example.com",)
+
+    def get_embed_url(self, url):
+        return "https://lazy.example.com/embed"
+"""
+
+
+def test_lazy_plugins(tmp_path, monkeypatch, embeds):
+    """
+    Import a plugin only when an enclosure matches one of its domains.
+
+    Arrange: Create a plugin package, and discover it to build a manifest.
+    Act: Forget the plugin, discover it again, then look up an enclosure.
+    Then change the plugin's source.
+    Assert: The plugin isn't imported until its domain is matched, and the
+    manifest is stale once its source changes.
+    """
+    package = tmp_path / "lazyplugin"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "player_embeds.py").write_text(PLUGIN_MODULE)
+    manifest = str(tmp_path / "plugins.json")
+    name = "lazyplugin.player_embeds"
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(settings, "PLUGINS", ["lazyplugin"])
+
+    try:
+        plugins.discover(embeds, manifest)
+        assert plugins.read_manifest(manifest, plugins.get_plugins()) == {
+            name: {
+                "domains": ["media.lazy.example.com"],
+                "fallback": False
+            }
+        }, "Manifest not saved."
+
+        del sys.modules[name]
+        del sys.modules["lazyplugin"]
+        plugins.discover(embeds, manifest)
+        assert name not in sys.modules, "Plugin imported eagerly."
+        assert "lazyplugin" not in sys.modules, "Plugin package imported."
+
+        html = embeds.get_html("https://media.lazy.example.com/1.mp3")
+        assert name in sys.modules, "Plugin not imported on demand."
+        assert "lazy.example.com/embed" in html, "Plugin player not used."
+
+        (package / "player_embeds.py").write_text(
+            PLUGIN_MODULE.replace("media.lazy", "cdn.lazy")
+        )
+
+        assert plugins.read_manifest(
+            manifest,
+            plugins.get_plugins()
+        ) is None, "Changed plugin not noticed."
+    finally:
+        sys.modules.pop(name, None)
+        sys.modules.pop("lazyplugin", None)
+
+
+def test_plugin_source_stamp(tmp_path):
+    """
+    Find the source of a plugin installed by a distribution.
+
+    Arrange: Create a distribution stand-in that lists a plugin module.
+    Act: Get the plugin's source stamp, then change its source.
+    Assert: The stamp is found without importing the plugin, and changes
+    with its source.
+    """
+    from importlib.metadata import PackagePath
+
+    source = tmp_path / "distplugin" / "players.py"
+    source.parent.mkdir()
+    source.write_text(PLUGIN_MODULE)
+
+    class Distribution(object):
+        files = [PackagePath("distplugin", "players.py")]
+
+        def locate_file(self, path):
+            return tmp_path / path
+
+    stamp = plugins.get_source_stamp("distplugin.players", Distribution())
+    assert stamp is not None, "Source not found."
+    assert "distplugin" not in sys.modules, "Plugin imported."
+
+    source.write_text(PLUGIN_MODULE + "\n")
+    assert plugins.get_source_stamp(
+        "distplugin.players",
+        Distribution()
+    ) != stamp, "Changed source not noticed."
+    assert plugins.get_source_stamp("missing.players") is None
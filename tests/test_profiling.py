@@ -0,0 +1,87 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_profiling
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's profiling module.
+"""
+
+from ghostexporter import models
+from ghostexporter.profiling import Profiler
+from ghostexporter.transformers.v5 import Ghost5Transformer
+from unittest.mock import patch
+from .utils import FEED, FakeResponse, make_items
+import io
+
+
+def test_profiler():
+    """
+    Profile the sanitisation and writing of a document.
+
+    Arrange: Install a profiler.
+    Act: Build items and write them to a document, then uninstall it.
+    Assert: Each stage is timed, and the original functions are restored.
+    """
+    sanitise = models.sanitise
+    write_document = Ghost5Transformer.write_document
+    profiler = Profiler()
+    profiler.install()
+
+    try:
+        items = make_items(3)
+        Ghost5Transformer(lambda: items).write(io.StringIO())
+    finally:
+        profiler.uninstall()
+
+    stats = profiler.get_stats()
+    assert stats["sanitise"]["calls"] == 3, "Sanitisation not profiled."
+    assert stats["transform"]["calls"] == 3, "Transformation not profiled."
+    assert stats["write"]["calls"] == 1, "Writing not profiled."
+    assert stats["encode"]["calls"] == 1, "Encoding time not derived."
+    assert (
+        stats["encode"]["total"] < stats["write"]["total"]
+    ), "Encoding time includes other stages."
+
+    assert models.sanitise is sanitise, "Function not restored."
+    assert (
+        Ghost5Transformer.write_document is write_document
+    ), "Method not restored."
+
+    stream = io.StringIO()
+    profiler.report(stream)
+    assert "wall time" in stream.getvalue(), "Report not written."
+
+
+def test_profiler_stream():
+    """
+    Profile a streamed feed, written across several documents.
+
+    Arrange: Mock a GET request for a feed, and install a profiler.
+    Act: Write the feed's items, parsed as they download, to shards.
+    Assert: Fetching, parsing, writing and encoding are each timed, and
+    the feed's size is counted.
+    """
+    profiler = Profiler()
+    profiler.install()
+
+    try:
+        with patch(
+            "requests.get",
+            lambda url, **kwargs: FakeResponse(200, {}, FEED)
+        ):
+            items = models.ItemList(
+                "https://example.com/feed.xml",
+                stream=True
+            )
+
+            items.check()
+            items.to("5").write_shards(lambda index: io.StringIO())
+    finally:
+        profiler.uninstall()
+
+    stats = profiler.get_stats()
+    for stage in ("fetch", "download", "parse", "sanitise", "encode", "write"):
+        assert stats[stage]["calls"] > 0, "%s not profiled." % stage
+
+    assert profiler.bytes_fetched == len(FEED), "Bytes not counted."
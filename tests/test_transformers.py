@@ -0,0 +1,211 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_transformers
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's document transformers.
+"""
+
+from datetime import datetime, timedelta, timezone
+from ghostexporter.transformers.base import GhostEncoder, ItemsHook
+from ghostexporter.transformers.v5 import Ghost5Transformer
+from .utils import make_items
+import io
+import json
+import pytest
+
+
+class CollectingEncoder(json.JSONEncoder):
+    """Encoder that collects every item before writing the document."""
+
+    def default(self, value):
+        """Collect streamable content and transform dates."""
+        if isinstance(value, ItemsHook):
+            collections = {}
+            for item in value.transform():
+                for collection, docs in item.items():
+                    collections.setdefault(collection, []).extend(docs)
+
+            return collections
+
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+        return super().default(value)
+
+
+@pytest.mark.parametrize("serialiser", ["json", "orjson"])
+def test_streamed_document(serialiser):
+    """
+    Stream a document containing several items.
+
+    Arrange: Create a v5 transformer with a handful of items, one with
+    non-ASCII content.
+    Act: Stream the document, then encode the collected items in one go
+    with the standard library's encoder.
+    Assert: Both documents are identical.
+    """
+    pytest.importorskip(serialiser)
+    items = make_items(5)
+    items[1].title = "Caf\u00e9 \u201cculture\u201d\x7f"
+    transformer = Ghost5Transformer(lambda: items, serialiser=serialiser)
+    doc = transformer.transform_items(transformer.items_hook)
+    streamed = "".join(transformer.encoder.iterencode(doc))
+
+    assert (
+        streamed == json.dumps(doc, cls=CollectingEncoder)
+    ), "Streamed document does not match."
+
+
+def test_streamed_empty_document():
+    """
+    Stream a document containing no items.
+
+    Arrange: Create a v5 transformer with no items.
+    Act: Write the document to a stream.
+    Assert: The data object is empty.
+    """
+    transformer = Ghost5Transformer(lambda: [])
+    stream = io.StringIO()
+    transformer.write(stream)
+    doc = json.loads(stream.getvalue())
+
+    assert doc["db"][0]["data"] == {}, "Data object should be empty."
+
+
+@pytest.mark.parametrize("serialiser", ["json", "orjson"])
+def test_rendered_post(serialiser):
+    """
+    Render a post from the pre-serialised templates.
+
+    Arrange: Create a v5 transformer and an item with non-ASCII content.
+    Act: Transform the item, and encode its post with each serialisation
+    backend.
+    Assert: The post is a plain dict, rendered identically to the same post
+    serialised without a template.
+    """
+    pytest.importorskip(serialiser)
+    item = make_items(1)[0]
+    item.title = "Caf\u00e9 \u201cculture\u201d\x7f"
+    transformer = Ghost5Transformer(lambda: [item], serialiser=serialiser)
+    html = transformer.build_content(item)
+    lexical = {
+        "root": {
+            "children": [
+                {
+                    "type": "html",
+                    "html": html,
+                    "version": 1
+                }
+            ],
+            "type": "root"
+        }
+    }
+
+    expected = {
+        "id": item.id,
+        "slug": item.slug,
+        "title": item.title,
+        "html": html,
+        "lexical": json.dumps(lexical),
+        "type": "post",
+        "status": "published",
+        "visibility": "public",
+        "created_at": item.created,
+        "published_at": item.published
+    }
+
+    doc = transformer.transform_item(item)
+    post = doc["posts"][0]
+
+    assert dict(post, lexical=json.loads(post["lexical"])) == dict(
+        expected,
+        lexical=lexical
+    ), "Post fields do not match."
+
+    assert (
+        transformer.encoder.encode_doc(post) ==
+        json.dumps(expected, cls=GhostEncoder)
+    ), "Rendered post does not match."
+
+    post["tags"] = ["podcast"]
+    assert (
+        json.loads(transformer.encoder.encode_doc(post))["tags"] ==
+        ["podcast"]
+    ), "Changed post rendered from its template."
+
+
+@pytest.mark.parametrize("serialiser", ["json", "orjson"])
+def test_dates_in_utc(serialiser):
+    """
+    Write a document for an item published with a UTC offset.
+
+    Arrange: Create an item published at 09:00, five hours behind UTC.
+    Act: Write a document with each serialisation backend.
+    Assert: The post's publish date is written in UTC.
+    """
+    pytest.importorskip(serialiser)
+    item = make_items(1)[0]
+    item.published = datetime(
+        2024, 1, 1, 9,
+        tzinfo=timezone(timedelta(hours=-5))
+    )
+
+    stream = io.StringIO()
+    Ghost5Transformer(lambda: [item], serialiser=serialiser).write(stream)
+    post = json.loads(stream.getvalue())["db"][0]["data"]["posts"][0]
+
+    assert (
+        post["published_at"] == "2024-01-01T14:00:00.000Z"
+    ), "Date not converted to UTC."
+
+
+@pytest.mark.parametrize(
+    "max_items,max_size,sizes",
+    [
+        (3, None, [3, 3, 1]),
+        (None, 1576, [3, 3, 1]),
+        (None, 1575, [2, 2, 2, 1]),
+        (None, 1, [1, 1, 1, 1, 1, 1, 1])
+    ]
+)
+def test_sharded_document(max_items, max_size, sizes):
+    """
+    Split a document into several smaller ones.
+
+    Arrange: Create a v5 transformer with several items.
+    Act: Write the items across documents of a maximum size.
+    Assert: Each document is valid and within its limits, and together
+    they contain every post, in order.
+    """
+    items = make_items(7)
+    shards = []
+
+    class Shard(io.StringIO):
+        def __exit__(self, *args):
+            shards.append(self.getvalue())
+
+    count = Ghost5Transformer(lambda: items).write_shards(
+        lambda index: Shard(),
+        max_items=max_items,
+        max_size=max_size
+    )
+
+    docs = [json.loads(shard)["db"][0]["data"] for shard in shards]
+    assert count == len(shards), "Incorrect number of documents."
+    assert [len(doc["posts"]) for doc in docs] == sizes, "Wrong sizes."
+    assert [
+        post["id"] for doc in docs for post in doc["posts"]
+    ] == [item.id for item in items], "Posts missing or out of order."
+
+    assert all(
+        [author["post_id"] for author in doc["posts_authors"]] ==
+        [post["id"] for post in doc["posts"]]
+        for doc in docs
+    ), "Authors not sharded with their posts."
+
+    if max_size and max_size > 1:
+        assert all(
+            len(shard) <= max_size for shard in shards
+        ), "Document too large."
@@ -0,0 +1,244 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_upload
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's Ghost Admin API upload module.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from ghostexporter.transformers.v5 import Ghost5Transformer
+from ghostexporter.upload import (
+    AdminClient,
+    Uploader,
+    UploadError,
+    b64,
+    get_field
+)
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+from .utils import make_items
+import hashlib
+import hmac
+import json
+import pytest
+
+
+KEY_ID = "abc123"
+SECRET = "00112233445566778899aabbccddeeff"
+KEY = "%s:%s" % (KEY_ID, SECRET)
+
+
+class GhostStandIn(object):
+    """In-memory stand-in for the posts endpoints of the Admin API."""
+
+    def __init__(self, failures: int = 0, lost: int = 0):
+        """
+        Initialise with a number of requests to fail before succeeding.
+
+        The responses to the first `lost` posts created are replaced with
+        errors, as if the connection had dropped.
+        """
+        self.posts = {}
+        self.requests = []
+        self.failures = failures
+        self.lost = lost
+        self.lock = Lock()
+
+    def authorised(self, header: str):
+        """Return whether a request carries a valid token."""
+        scheme, _, token = header.partition(" ")
+        signing_input, _, signature = token.rpartition(".")
+        expected = hmac.new(
+            bytes.fromhex(SECRET),
+            signing_input.encode("ascii"),
+            hashlib.sha256
+        ).digest()
+
+        return scheme == "Ghost" and signature == b64(expected)
+
+    def handle(self, method: str, path: str, query: dict, body: dict):
+        """Return a status code and body for a request."""
+        with self.lock:
+            self.requests.append((method, path))
+
+            if self.failures:
+                self.failures -= 1
+                return 503, {"errors": [{"message": "Try again."}]}
+
+            if method == "GET":
+                slugs = query["filter"][0][6:-1].split(",")
+                return 200, {
+                    "posts": [
+                        {
+                            "id": post["id"],
+                            "slug": post["slug"],
+                            "updated_at": post["updated_at"]
+                        }
+                        for post in self.posts.values()
+                        if post["slug"] in slugs
+                    ]
+                }
+
+            post = body["posts"][0]
+
+            if method == "POST":
+                post["id"] = "post-%d" % (len(self.posts) + 1)
+                post["updated_at"] = "v1"
+                self.posts[post["id"]] = post
+
+                if self.lost:
+                    self.lost -= 1
+                    return 502, {"errors": [{"message": "Bad gateway."}]}
+
+                return 201, {"posts": [post]}
+
+            post_id = path.split("/")[-2]
+            if post["updated_at"] != self.posts[post_id]["updated_at"]:
+                return 409, {"errors": [{"message": "Conflict."}]}
+
+            post.update(id=post_id, updated_at="v2")
+            self.posts[post_id] = post
+            return 200, {"posts": [post]}
+
+
+@contextmanager
+def serve(ghost: GhostStandIn):
+    """Serve the stand-in Admin API on a local port."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def respond(self):
+            url = urlsplit(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length)) if length else None
+
+            if not ghost.authorised(self.headers.get("Authorization", "")):
+                status, result = 401, {"errors": []}
+            else:
+                status, result = ghost.handle(
+                    self.command,
+                    url.path,
+                    parse_qs(url.query),
+                    body
+                )
+
+            content = json.dumps(result).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def upload(url: str, items, batch_size: int = 2):
+    """Upload items to a site, returning the uploader."""
+    client = AdminClient(url, KEY, backoff=0)
+    uploader = Uploader(client, batch_size=batch_size)
+
+    try:
+        uploader.upload(Ghost5Transformer(lambda: items))
+    finally:
+        client.close()
+
+    return uploader
+
+
+def test_upload():
+    """
+    Upload posts to the Admin API, then upload them again.
+
+    Arrange: Serve a stand-in Admin API that fails its first request.
+    Act: Upload five posts in batches of two, twice.
+    Assert: Posts are created, then updated rather than duplicated.
+    """
+    ghost = GhostStandIn(failures=1)
+    items = make_items(5)
+
+    with serve(ghost) as url:
+        first = upload(url, items)
+        second = upload(url, items)
+
+    assert (first.created, first.updated) == (5, 0), "Posts not created."
+    assert (second.created, second.updated) == (0, 5), "Posts not updated."
+    assert len(ghost.posts) == 5, "Posts duplicated."
+
+    assert sorted(
+        post["slug"] for post in ghost.posts.values()
+    ) == sorted(item.slug for item in items), "Incorrect slugs."
+
+    assert all(
+        post["status"] == "published" and "lexical" in post
+        for post in ghost.posts.values()
+    ), "Incorrect post fields."
+
+    lookups = [r for r in ghost.requests if r[0] == "GET"]
+    assert len(lookups) == 7, "Slugs not looked up once per batch."
+
+
+def test_upload_gives_up():
+    """
+    Upload posts to an Admin API that keeps failing.
+
+    Arrange: Serve a stand-in Admin API that fails every request.
+    Act: Upload a post.
+    Assert: The upload fails once retries are exhausted.
+    """
+    ghost = GhostStandIn(failures=100)
+
+    with serve(ghost) as url:
+        with pytest.raises(UploadError):
+            upload(url, make_items(1))
+
+    assert len(ghost.requests) == 6, "Request not retried."
+
+
+def test_upload_lost_response():
+    """
+    Upload posts when the response to creating one is lost.
+
+    Arrange: Serve a stand-in Admin API that loses its first create
+    response, and a list of posts where two share a slug.
+    Act: Upload the posts.
+    Assert: No post is created twice.
+    """
+    ghost = GhostStandIn(lost=1)
+    items = make_items(3)
+    items.append(make_items(1)[0])
+
+    with serve(ghost) as url:
+        uploader = upload(url, items, batch_size=4)
+
+    assert len(ghost.posts) == 3, "Posts duplicated."
+    assert uploader.created + uploader.updated == 3, "Incorrect counts."
+
+
+def test_get_field_date():
+    """
+    Send a date with a UTC offset to the Admin API.
+
+    Arrange/Act: Get the field value for a date five hours behind UTC.
+    Assert: The date is sent in UTC.
+    """
+    date = datetime(2024, 1, 1, 9, tzinfo=timezone(timedelta(hours=-5)))
+    assert (
+        get_field(date) == "2024-01-01T14:00:00.000Z"
+    ), "Date not converted to UTC."
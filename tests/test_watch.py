@@ -0,0 +1,74 @@
+"""
+Unit tests.
+
+.. currentmodule:: test_watch
+.. moduleauthor:: Mark Steadman <mark@soundslocal.co.uk>
+
+This is the test module for the project's watch mode.
+"""
+
+from ghostexporter import settings
+from ghostexporter.watch import Watcher
+from unittest.mock import patch
+from .utils import FakeResponse, make_feed
+
+
+class Clock(object):
+    """A clock that only moves when slept."""
+
+    def __init__(self):
+        """Start the clock."""
+        self.now = 0.0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+    def sleep(self, seconds: float):
+        """Move the clock forward."""
+        self.now += seconds
+
+
+def test_watch():
+    """
+    Watch a feed that publishes a new episode.
+
+    Arrange: Mock GET requests, honouring ETags, for a daily feed.
+    Act: Poll the feed three times, publishing an episode before the last.
+    Assert: Only new episodes are exported, at an interval that suits.
+    """
+    feeds = [make_feed(3)]
+    exported = []
+
+    def get(url, headers={}, **kwargs):
+        etag = str(len(feeds[0]))
+
+        if headers.get("If-None-Match") == etag:
+            return FakeResponse(304)
+
+        return FakeResponse(200, {"ETag": etag}, feeds[0])
+
+    clock = Clock()
+    watcher = Watcher(
+        ["https://example.com/feed.xml"],
+        lambda items: exported.append([item.title for item in items.all()]),
+        clock=clock,
+        sleep=clock.sleep
+    )
+
+    with patch("requests.get", get):
+        watcher.run(polls=2)
+        feeds[0] = make_feed(4)
+        watcher.run(polls=1)
+
+    assert exported == [
+        ["Episode 1", "Episode 2", "Episode 3"],
+        ["Episode 4"]
+    ], "Incorrect episodes exported."
+
+    interval = 24 * 60 * 60 / settings.WATCH_POLLS_PER_EPISODE
+    assert watcher.get_interval(
+        "https://example.com/feed.xml"
+    ) == interval, "Interval not adapted to publish frequency."
+
+    assert clock.now == 2 * interval, "Polls not spaced by interval."
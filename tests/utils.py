@@ -9,6 +9,8 @@ This module provides utilities for unit tests.
 
 
 from base64 import b64encode, b64decode
+from datetime import datetime, timezone
+from ghostexporter.models import Item
 from hashlib import md5
 from requests import (
     head as requests_head,
@@ -24,6 +26,70 @@ import os
 import requests
 
 
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+  <channel>
+    <title>Test</title>
+    <item>
+      <title>Episode 1</title>
+      <pubDate>Mon, 01 Jan 2024 09:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/1.mp3" type="audio/mpeg" />
+    </item>
+  </channel>
+</rss>
+"""
+
+FEED_ITEM = """<item>
+  <title>Episode %d</title>
+  <guid>episode-%d</guid>
+  <pubDate>%s Jan 2024 09:00:00 +0000</pubDate>
+  <enclosure url="https://example.com/%d.mp3" type="audio/mpeg" />
+</item>"""
+
+
+def make_feed(count: int):
+    """Return an RSS feed body with one episode a day."""
+    return (
+        "<rss version=\"2.0\"><channel><title>Test</title>%s</channel></rss>"
+        % "".join(
+            FEED_ITEM % (number, number, "%02d" % number, number)
+            for number in range(1, count + 1)
+        )
+    ).encode("utf-8")
+
+
+def make_items(count: int):
+    """Return a list of items that don't need network access."""
+    return [
+        Item(
+            title="Episode %d" % (index + 1),
+            published=datetime(2024, 1, index + 1, tzinfo=timezone.utc),
+            enclosure="https://example.com/%d.mp3" % index,
+            description="<p>Show notes <script>alert(1)</script></p>"
+        ) for index in range(count)
+    ]
+
+
+class FakeResponse(object):
+    """A stand-in for a `requests` response."""
+
+    def __init__(self, status_code: int, headers: dict = None, content=b""):
+        """Initialise the response with a status, headers and body."""
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+        self.content = content
+
+    def raise_for_status(self):
+        """Do nothing, as errors aren't raised."""
+
+    def iter_content(self, chunk_size: int):
+        """Yield the body in one chunk."""
+        yield self.content
+
+    def close(self):
+        """Do nothing, as there is nothing to close."""
+
+
 def mock_http(app, context="test"):
     # pragma: no cover
     """
@@ -60,6 +126,9 @@ def mock_http(app, context="test"):
         def iter_content(self, chunk_size):
             yield self.content
 
+        def close(self):
+            pass
+
         def json(self):
             return json.loads(self.content)
 
@@ -133,6 +202,16 @@ def mock_http(app, context="test"):
         fn = patch("requests.head", mock_head)(fn)
         fn = patch("requests.get", mock_get)(fn)
         fn = patch("requests.post", mock_post)(fn)
+        fn = patch(
+            "requests.Session.head",
+            lambda session, url, **kwargs: mock_head(url, **kwargs)
+        )(fn)
+
+        fn = patch(
+            "requests.Session.get",
+            lambda session, url, **kwargs: mock_get(url, **kwargs)
+        )(fn)
+
         return fn
 
     return func